@@ -0,0 +1,123 @@
+import os                      # For file paths and directory handling
+import time                    # For ageing out abandoned temporary files
+import shutil                  # For moving finished files into the store
+import hashlib                 # For content-addressed artifact paths
+import tempfile                # For unique work files inside the store
+
+
+# Store setup
+ARTIFACT_ROOT = os.environ.get("ARTIFACT_ROOT", "output")
+CHUNK_SIZE = 1024 * 1024
+MAX_STORE_BYTES = int(os.environ.get("ARTIFACT_MAX_BYTES", 20 * 1024 ** 3))
+TMP_MAX_AGE = 24 * 3600
+
+def object_path(digest, ext, root=ARTIFACT_ROOT):
+    return os.path.join(root, "objects", digest[:2], digest + ext)
+
+def new_work_path(suffix, root=ARTIFACT_ROOT):
+    work_dir = os.path.join(root, "tmp")
+    os.makedirs(work_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=work_dir, suffix=suffix)
+    os.close(fd)
+    return path
+
+def commit_work_file(work_path, digest, ext, root=ARTIFACT_ROOT):
+    path = object_path(digest, ext, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        # Identical content is already stored; keep one copy and mark it as recently used
+        os.remove(work_path)
+        os.utime(path)
+    else:
+        shutil.move(work_path, path)
+    return path
+
+# Writing
+
+def store_stream(stream, ext, root=ARTIFACT_ROOT):
+    # Copies an upload in fixed-size chunks so it is never held twice in memory
+    if hasattr(stream, "seek"):
+        stream.seek(0)
+    work_path = new_work_path(ext, root)
+    digest = hashlib.sha256()
+    with open(work_path, "wb") as f:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            f.write(chunk)
+    return commit_work_file(work_path, digest.hexdigest(), ext, root)
+
+def store_file(work_path, root=ARTIFACT_ROOT):
+    digest = hashlib.sha256()
+    with open(work_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return commit_work_file(work_path, digest.hexdigest(), os.path.splitext(work_path)[1], root)
+
+def file_digest(path):
+    # Store paths already carry the SHA-256 of their content
+    name = os.path.basename(path).split(".")[0]
+    if len(name) == 64 and all(c in "0123456789abcdef" for c in name):
+        return name
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Reading
+
+def open_artifact(path):
+    os.utime(path)
+    return open(path, "rb")
+
+# Retention
+
+def release_artifacts(paths, keep=()):
+    keep = set(keep)
+    for path in paths:
+        if not path or path in keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error deleting artifact {path}: {e}")
+
+def enforce_quota(max_bytes=MAX_STORE_BYTES, root=ARTIFACT_ROOT, keep=()):
+    # keep: objects that must not be evicted, e.g. the uploads of jobs still in the queue
+    keep = {os.path.normpath(path) for path in keep if path}
+    now = time.time()
+    tmp_dir = os.path.join(root, "tmp")
+    if os.path.isdir(tmp_dir):
+        for name in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, name)
+            try:
+                if now - os.path.getmtime(path) > TMP_MAX_AGE:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    files = []
+    total = 0
+    for dirpath, _, filenames in os.walk(os.path.join(root, "objects")):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # Kept objects still take up space; they just can't be the ones that go
+            total += stat.st_size
+            if os.path.normpath(path) not in keep:
+                files.append((stat.st_mtime, stat.st_size, path))
+
+    # Least recently used artifacts go first
+    evicted = []
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        release_artifacts([path])
+        total -= size
+        evicted.append(path)
+    return evicted
@@ -0,0 +1,230 @@
+import os                      # For file discovery and output paths
+import sys                     # For the exit status
+import csv                     # Per-file throughput report
+import time                    # For wall-clock timings
+import json                    # Manifests and the checkpoint log
+import shutil                  # For copying finished outputs out of the artifact store
+import hashlib                 # For checkpoint keys
+import argparse                # Command line interface
+import multiprocessing         # Spawned workers keep torch state out of the parent
+import concurrent.futures      # Process pool of pipeline workers
+
+
+MEDIA_EXTENSIONS = (".mp4", ".mov", ".mkv", ".webm", ".m4v", ".mp3", ".wav", ".m4a")
+# Settings that change the output; a file is redone when any of them differ from its checkpoint
+OUTPUT_PARAMS = ("spoken_lang", "target_langs", "model_size", "device", "output_mode", "render_engine", "x264_preset")
+
+# Inputs
+
+def discover(source):
+    # A directory is scanned recursively; a manifest is a .json list or a text file with one path per line.
+    # JSON entries may be objects with per-file overrides, e.g. {"path": "a.mp4", "target_lang": "de,fr"}
+    if os.path.isdir(source):
+        items = []
+        for dirpath, _, filenames in os.walk(source):
+            for name in sorted(filenames):
+                if name.lower().endswith(MEDIA_EXTENSIONS):
+                    # Outputs mirror the source tree so same-named files in different folders don't collide
+                    items.append({"path": os.path.join(dirpath, name), "subdir": os.path.relpath(dirpath, source)})
+        return sorted(items, key=lambda item: item["path"])
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        if source.lower().endswith(".json"):
+            entries = json.load(f)
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    items = [entry if isinstance(entry, dict) else {"path": entry} for entry in entries]
+    for item in items:
+        item["path"] = os.path.join(base, item["path"])
+    return items
+
+def file_params(params, item):
+    # Manifest entries override the command line settings for their file
+    return dict(params, **{key: value for key, value in item.items() if key not in ("path", "subdir", "key")})
+
+def language_params(target_lang, names):
+    # "de,fr" -> both languages from one transcription; the first also fills the single-language keys
+    codes = [code.strip() for code in target_lang.split(",") if code.strip()] if isinstance(target_lang, str) else list(target_lang)
+    return {"target_lang": codes[0], "target_name": names.get(codes[0], codes[0]),
+            "target_langs": codes, "target_names": [names.get(code, code) for code in codes]}
+
+def checkpoint_key(path, params):
+    # Same file contents (by size and mtime) and same output settings -> same key
+    stat = os.stat(path)
+    settings = json.dumps({key: params.get(key) for key in OUTPUT_PARAMS}, sort_keys=True)
+    return hashlib.sha256(f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{settings}".encode("utf-8")).hexdigest()
+
+def load_checkpoint(path):
+    # Append-only JSON lines; the last record for a key wins, so a crash loses at most the file in flight
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                done[record["key"]] = record
+    return done
+
+# Workers
+
+def init_worker(threads):
+    # Set before torch is imported so every worker stays within its share of the cores
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+
+def process_file(item, params, output_dir):
+    from pipeline import run_pipeline
+    from telemetry import trace
+
+    path = item["path"]
+    params = file_params(params, item)
+    params.setdefault("stem", os.path.splitext(os.path.basename(path))[0])
+    record = {"file": path, "key": item["key"], "started_at": time.time()}
+    started = time.perf_counter()
+    try:
+        with trace(item["key"][:16], file=path):
+            result = run_pipeline(path, params)
+        target_dir = os.path.normpath(os.path.join(output_dir, item.get("subdir", "")))
+        os.makedirs(target_dir, exist_ok=True)
+        outputs = {}
+        for output in result["outputs"]:
+            stored = {"srt": output["srt_path"], "video": output["video_path"], **output["sidecar_paths"]}
+            for kind, stored_path in stored.items():
+                # Soft-subtitle jobs share one video between languages; copy it once
+                destination = os.path.join(target_dir, output["output_names"][kind])
+                if destination not in outputs.values():
+                    shutil.copyfile(stored_path, destination)
+                outputs[f"{output['lang']}:{kind}"] = destination
+        record.update(status="done", outputs=outputs, segments=result["segment_count"], media_seconds=result["duration"])
+    except Exception as e:
+        record.update(status="failed", error=f"{e.__class__.__name__}: {e}")
+    record["wall_seconds"] = round(time.perf_counter() - started, 3)
+    if record.get("media_seconds"):
+        record["realtime_factor"] = round(record["media_seconds"] / record["wall_seconds"], 3)
+    return record
+
+# Reporting
+
+def report_records(items, checkpoint_path):
+    # One row per input file, from the whole checkpoint so files finished by earlier runs stay in the report
+    done = load_checkpoint(checkpoint_path)
+    return [done[item["key"]] for item in items if item["key"] in done]
+
+def write_report(records, path):
+    fields = ["file", "status", "media_seconds", "wall_seconds", "realtime_factor", "segments", "error"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(records)
+
+def summarize(records, wall):
+    done = [r for r in records if r["status"] == "done"]
+    media = sum(r.get("media_seconds") or 0 for r in done)
+    return {
+        "files": len(records),
+        "done": len(done),
+        "failed": len(records) - len(done),
+        "wall_seconds": round(wall, 1),
+        "media_seconds": round(media, 1),
+        "files_per_hour": round(len(done) / wall * 3600, 1) if wall else 0.0,
+        "media_hours_per_hour": round(media / wall, 2) if wall else 0.0,
+    }
+
+# Main
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate subtitles for a directory or manifest of media files")
+    parser.add_argument("source", help="Directory of media files, or a .txt/.json manifest")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="Where subtitles and videos are written")
+    parser.add_argument("-t", "--target-lang", default="en", help="Subtitle language code, or several separated by commas")
+    parser.add_argument("-s", "--spoken-lang", default=None, help="Spoken language code (default: detect)")
+    parser.add_argument("-m", "--model", default="medium", help="Whisper model size")
+    parser.add_argument("--device", default="cpu", choices=["cpu", "cuda"])
+    parser.add_argument("--output-mode", default="burned", choices=["burned", "soft"])
+    parser.add_argument("--engine", default="ffmpeg", choices=["ffmpeg", "parallel", "opencv"])
+    parser.add_argument("--preset", default="veryfast", help="x264 preset for the ffmpeg engine")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Parallel files (default: fits the RAM budget)")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint log (default: <output-dir>/checkpoint.jsonl)")
+    parser.add_argument("--report", default=None, help="Per-file CSV report (default: <output-dir>/report.csv)")
+    parser.add_argument("--retry-failed", action="store_true", help="Also redo files that failed in an earlier run")
+    args = parser.parse_args()
+
+    from languages import get_language_table
+    from chunked_transcription import plan_replicas
+    from artifact_store import enforce_quota
+    from job_queue import active_upload_paths
+
+    names = {code: name.title() for name, code in get_language_table()["languages"].items()}
+    params = {
+        "spoken_lang": args.spoken_lang, "spoken_name": names.get(args.spoken_lang, "Auto"),
+        **language_params(args.target_lang, names),
+        "model_size": args.model, "device": args.device,
+        "output_mode": args.output_mode, "render_engine": args.engine, "x264_preset": args.preset,
+        "streaming": True,
+    }
+    checkpoint_path = args.checkpoint or os.path.join(args.output_dir, "checkpoint.jsonl")
+    report_path = args.report or os.path.join(args.output_dir, "report.csv")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    items = discover(args.source)
+    done = load_checkpoint(checkpoint_path)
+    pending = []
+    for item in items:
+        if "target_lang" in item:
+            item.update(language_params(item["target_lang"], names))
+        item["key"] = checkpoint_key(item["path"], file_params(params, item))
+        previous = done.get(item["key"])
+        if previous and (previous["status"] == "done" or not args.retry_failed):
+            continue
+        pending.append(item)
+    print(f"{len(items)} files, {len(items) - len(pending)} already processed, {len(pending)} to go")
+    if not pending:
+        write_report(report_records(items, checkpoint_path), report_path)
+        return 0
+
+    # Each worker holds its own Whisper model, so the RAM budget caps the pool
+    workers = min(len(pending), args.workers or plan_replicas(args.model))
+    if workers > 1:
+        # Files are already processed in parallel; nested chunk pools would only oversubscribe the cores
+        params["transcription_mode"] = "single"
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    records = []
+    started = time.perf_counter()
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint, concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker, initargs=(threads,)
+    ) as executor:
+        futures = {executor.submit(process_file, item, params, args.output_dir): item for item in pending}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # A worker that dies (OOM kill, segfault in a codec) takes the pool down; record it and let a rerun resume
+                    item = futures[future]
+                    record = {"file": item["path"], "key": item["key"], "status": "failed",
+                              "error": f"{e.__class__.__name__}: {e}", "wall_seconds": 0.0}
+                records.append(record)
+                checkpoint.write(json.dumps(record) + "\n")
+                checkpoint.flush()
+                rate = f"{record['realtime_factor']:.2f}x realtime" if record.get("realtime_factor") else record.get("error", "")
+                print(f"[{len(records)}/{len(pending)}] {record['status']:<6} {record['file']} ({record['wall_seconds']:.1f}s, {rate})")
+        except KeyboardInterrupt:
+            # Finished files are already in the checkpoint; the next run picks up the rest
+            print("Interrupted, cancelling queued files...")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    # Store objects are content-addressed and may be shared with web jobs, so they are left to the quota sweep
+    enforce_quota(keep=active_upload_paths())
+    write_report(report_records(items, checkpoint_path), report_path)
+    summary = summarize(records, time.perf_counter() - started)
+    print(json.dumps(summary, indent=2))
+    print(f"Report written to {report_path}")
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
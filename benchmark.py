@@ -0,0 +1,301 @@
+import os                      # For file paths and environment setup
+import sys                     # For the exit status when a regression is found
+import time                    # For wall-clock timings
+import json                    # Baselines are stored as JSON
+import uuid                    # Fresh media hashes so every end-to-end run misses the transcript cache
+import shutil                  # For cleaning up the benchmark work directory
+import platform                # Recorded next to the results so baselines are comparable
+import resource                # For peak RSS of each stage process
+import argparse                # Command line interface
+import tempfile                # Work directory for generated media and outputs
+import statistics              # Median over repeated runs
+import subprocess              # For generating synthetic videos with ffmpeg
+import multiprocessing         # Every stage runs in a fresh process so peak RSS is per stage
+import concurrent.futures      # Single-worker pools for the stage processes
+
+
+# Benchmarks run from the repo root: font paths and the artifact store are relative to it
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmark_baseline.json")
+
+# name: (width, height, duration seconds, fps, subtitle segments per minute)
+SCENARIOS = {
+    "360p_sparse": (640, 360, 10, 25, 12),
+    "720p_dense": (1280, 720, 20, 30, 40),
+    "1080p_sparse": (1920, 1080, 10, 30, 12),
+    "360p_long": (640, 360, 120, 25, 20),
+}
+QUICK_SCENARIOS = ["360p_sparse"]
+
+SAMPLE_TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "مرحبا بكم في البرنامج",
+    "שלום וברוכים הבאים",
+    "नमस्ते और स्वागत है",
+    "আমাদের অনুষ্ঠানে স্বাগতম",
+    "வணக்கம் மற்றும் வரவேற்கிறோம்",
+    "สวัสดีและยินดีต้อนรับ",
+    "ሰላም እና እንኳን ደህና መጡ",
+    "Բարի գալուստ",
+    "გამარჯობა და კეთილი იყოს თქვენი მობრძანება",
+]
+
+# Synthetic inputs
+
+def make_segments(duration, per_minute, prefix="Subtitle line"):
+    step = 60.0 / per_minute
+    segments = []
+    start = 0.0
+    while start < duration:
+        end = min(duration, start + step * 0.8)
+        segments.append({"id": len(segments), "start": start, "end": end,
+                         "text": f"{prefix} {len(segments) + 1}: the quick brown fox jumps over the lazy dog"})
+        start += step
+    return segments
+
+def generate_video(path, width, height, duration, fps):
+    if os.path.exists(path):
+        return path
+    subprocess.run([
+        "ffmpeg", "-y", "-nostdin", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=16000:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", path
+    ], check=True)
+    return path
+
+class SyntheticWhisper:
+    # Stands in for a Whisper model: emits evenly spaced segments for whatever audio it is given
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+
+    def transcribe(self, audio, language=None, **kwargs):
+        segments = make_segments(len(audio) / 16000, self.per_minute, prefix="Spoken line")
+        return {"segments": segments, "language": language or "en", "text": " ".join(seg["text"] for seg in segments)}
+
+# Stages (run inside a fresh process each)
+
+def stage_font_selection(scenario, video_path, work_dir):
+    from subtitle_generator import get_font_for_text
+    iterations = 20000
+    texts = SAMPLE_TEXTS * (iterations // len(SAMPLE_TEXTS))
+    start = time.perf_counter()
+    for text in texts:
+        get_font_for_text(text)
+    return {"wall": time.perf_counter() - start, "items": len(texts)}
+
+def stage_export_srt(scenario, video_path, work_dir):
+    from subtitle_generator import export_srt
+    segments = make_segments(3600, SCENARIOS[scenario][4])
+    start = time.perf_counter()
+    export_srt(segments, os.path.join(work_dir, f"{scenario}.srt"))
+    return {"wall": time.perf_counter() - start, "items": len(segments)}
+
+def stage_decode_audio(scenario, video_path, work_dir):
+    from subtitle_generator import decode_audio
+    start = time.perf_counter()
+    audio = decode_audio(video_path)
+    return {"wall": time.perf_counter() - start, "items": len(audio)}
+
+def stage_render_opencv(scenario, video_path, work_dir):
+    from subtitle_generator import render_subtitles_on_video, get_font_for_text
+    width, height, duration, fps, per_minute = SCENARIOS[scenario]
+    segments = make_segments(duration, per_minute)
+    start = time.perf_counter()
+    render_subtitles_on_video(video_path, segments, os.path.join(work_dir, f"{scenario}_opencv.mp4"),
+                              get_font_for_text(segments[0]["text"]))
+    return {"wall": time.perf_counter() - start, "frames": duration * fps}
+
+def stage_render_ffmpeg(scenario, video_path, work_dir):
+    from subtitle_generator import render_subtitles_with_ffmpeg, export_srt, get_font_for_text
+    width, height, duration, fps, per_minute = SCENARIOS[scenario]
+    segments = make_segments(duration, per_minute)
+    srt_path = os.path.join(work_dir, f"{scenario}_burn.srt")
+    export_srt(segments, srt_path)
+    start = time.perf_counter()
+    render_subtitles_with_ffmpeg(video_path, srt_path, os.path.join(work_dir, f"{scenario}_ffmpeg.mp4"),
+                                 get_font_for_text(segments[0]["text"]))
+    return {"wall": time.perf_counter() - start, "frames": duration * fps}
+
+def stage_end_to_end(scenario, video_path, work_dir):
+    from model_registry import get_registry
+    from pipeline import run_pipeline
+    from artifact_store import release_artifacts
+    width, height, duration, fps, per_minute = SCENARIOS[scenario]
+    # Whisper is replaced by a synthetic model and translation by the offline backend (see main)
+    get_registry().loader = lambda model_size, device: SyntheticWhisper(per_minute)
+    params = {"spoken_lang": "en", "target_lang": "fr", "target_name": "French", "model_size": "tiny",
+              "device": "cpu", "transcription_mode": "single", "streaming": True, "output_mode": "burned",
+              "render_engine": "ffmpeg", "x264_preset": "veryfast", "stem": scenario, "media_hash": uuid.uuid4().hex}
+    start = time.perf_counter()
+    result = run_pipeline(video_path, params)
+    wall = time.perf_counter() - start
+
+    try:
+        # History is written the way the app does it, against an in-memory MongoDB
+        import mongomock
+        from db_setup import set_client, create_tables, push_history
+        set_client(mongomock.MongoClient())
+        create_tables()
+        start = time.perf_counter()
+        push_history("benchmark", {"srt_path": result["srt_path"], "video_path": result["video_path"]})
+        wall += time.perf_counter() - start
+    except ImportError:
+        pass
+
+    release_artifacts([result["srt_path"], result["video_path"], *result["sidecar_paths"].values()])
+    return {"wall": wall, "frames": duration * fps, "items": result["segment_count"]}
+
+STAGES = {
+    "font_selection": stage_font_selection,
+    "export_srt": stage_export_srt,
+    "decode_audio": stage_decode_audio,
+    "render_opencv": stage_render_opencv,
+    "render_ffmpeg": stage_render_ffmpeg,
+    "end_to_end": stage_end_to_end,
+}
+# Stages that do not depend on the input video only run once, not per scenario
+VIDEO_INDEPENDENT = {"font_selection"}
+# Only these read the generated video; the rest run without ffmpeg
+MEDIA_STAGES = {"decode_audio", "render_opencv", "render_ffmpeg", "end_to_end"}
+
+def run_stage_process(stage, scenario, video_path, work_dir):
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    result = STAGES[stage](scenario, video_path, work_dir)
+    # ru_maxrss is in KiB on Linux; children covers ffmpeg subprocesses
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    result["child_peak_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return result
+
+def run_stage(stage, scenario, video_path, work_dir, repeat):
+    runs = []
+    for _ in range(repeat):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            runs.append(executor.submit(run_stage_process, stage, scenario, video_path, work_dir).result())
+    wall = statistics.median(run["wall"] for run in runs)
+    metrics = {
+        "wall": round(wall, 4),
+        "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+        "child_peak_rss_mb": round(max(run["child_peak_rss_mb"] for run in runs), 1),
+    }
+    if "frames" in runs[0]:
+        metrics["fps"] = round(runs[0]["frames"] / wall, 2) if wall else 0.0
+    if "items" in runs[0]:
+        metrics["items_per_sec"] = round(runs[0]["items"] / wall, 1) if wall else 0.0
+    return metrics
+
+# Baselines
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, max_slowdown, max_rss_growth):
+    # Returns a list of human readable regressions against the baseline
+    regressions = []
+    for key, metrics in results.items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            continue
+        if base["wall"] and metrics["wall"] > base["wall"] * (1 + max_slowdown):
+            regressions.append(f"{key}: wall {metrics['wall']:.3f}s vs {base['wall']:.3f}s baseline")
+        if base.get("fps") and metrics.get("fps", 0) < base["fps"] / (1 + max_slowdown):
+            regressions.append(f"{key}: {metrics['fps']:.1f} fps vs {base['fps']:.1f} fps baseline")
+        if base["peak_rss_mb"] and metrics["peak_rss_mb"] > base["peak_rss_mb"] * (1 + max_rss_growth):
+            regressions.append(f"{key}: peak RSS {metrics['peak_rss_mb']:.0f} MB vs {base['peak_rss_mb']:.0f} MB baseline")
+    return regressions
+
+def print_table(results, baseline=None):
+    print(f"{'stage':<32} {'wall s':>9} {'fps':>9} {'items/s':>11} {'RSS MB':>8} {'vs base':>9}")
+    for key, metrics in results.items():
+        base = (baseline or {}).get("results", {}).get(key)
+        change = f"{(metrics['wall'] / base['wall'] - 1) * 100:+.0f}%" if base and base["wall"] else ""
+        print(f"{key:<32} {metrics['wall']:>9.3f} {metrics.get('fps', ''):>9} {metrics.get('items_per_sec', ''):>11} "
+              f"{metrics['peak_rss_mb']:>8.0f} {change:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the subtitle pipeline stages on synthetic media")
+    parser.add_argument("--scenarios", default=None, help="Comma separated scenarios (default: all)")
+    parser.add_argument("--stages", default=None, help="Comma separated stages (default: all)")
+    parser.add_argument("--quick", action="store_true", help="Only run the smallest scenario")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the median wall time is kept")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--save", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    parser.add_argument("--max-slowdown", type=float, default=0.20, help="Allowed wall time increase (fraction)")
+    parser.add_argument("--max-rss-growth", type=float, default=0.25, help="Allowed peak RSS increase (fraction)")
+    parser.add_argument("--media-dir", default=None, help="Keep generated videos here between runs")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",") if args.scenarios else (QUICK_SCENARIOS if args.quick else list(SCENARIOS))
+    stages = args.stages.split(",") if args.stages else list(STAGES)
+    for name in scenarios + stages:
+        if name not in SCENARIOS and name not in STAGES:
+            parser.error(f"Unknown scenario or stage: {name}")
+
+    work_dir = tempfile.mkdtemp(prefix="subtitle-bench-")
+    media_dir = args.media_dir or work_dir
+    os.makedirs(media_dir, exist_ok=True)
+    # Stage processes inherit these: no network translation and no shared caches between runs
+    os.environ["TRANSLATION_BACKEND"] = "offline"
+    os.environ["TRANSLATION_CACHE_PATH"] = os.path.join(work_dir, "translation_cache.sqlite")
+    os.environ["TRANSCRIPT_CACHE_DIR"] = os.path.join(work_dir, "transcripts")
+    os.environ["ARTIFACT_ROOT"] = os.path.join(work_dir, "artifacts")
+    # Synthetic Whisper timings must not leak into the ETA store the app learns from
+    os.environ["ETA_STORE_PATH"] = os.path.join(work_dir, "throughput.sqlite")
+    os.environ["TRACE_LOG_PATH"] = os.path.join(work_dir, "traces.jsonl")
+
+    results = {}
+    try:
+        for stage in stages:
+            for scenario in scenarios[:1] if stage in VIDEO_INDEPENDENT else scenarios:
+                width, height, duration, fps, _ = SCENARIOS[scenario]
+                video_path = None
+                if stage in MEDIA_STAGES:
+                    video_path = generate_video(os.path.join(media_dir, f"{scenario}.mp4"), width, height, duration, fps)
+                key = stage if stage in VIDEO_INDEPENDENT else f"{stage}/{scenario}"
+                print(f"Running {key}...", flush=True)
+                results[key] = run_stage(stage, scenario, video_path, work_dir, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save:
+        if baseline:
+            # Keep entries for stages that were not part of this run
+            report["results"] = dict(baseline.get("results", {}), **results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print("No baseline found; run with --save to create one.")
+        return 0
+    regressions = compare(results, baseline, args.max_slowdown, args.max_rss_growth)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import os                      # For CPU counts and replica settings
+import multiprocessing         # Spawned workers keep torch state out of the parent
+import concurrent.futures      # Process pool of model replicas
+import numpy as np             # Energy-based silence detection
+from model_registry import MODEL_BYTES, DEFAULT_BUDGET, load_whisper, get_registry
+
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 60
+MIN_CHUNKED_DURATION = 600
+MAX_REPLICAS = int(os.environ.get("WHISPER_REPLICAS", 0)) or max(1, min(4, (os.cpu_count() or 1) // 2))
+
+# Silence detection
+
+def frame_energy(audio, frame_samples):
+    usable = len(audio) - len(audio) % frame_samples
+    frames = audio[:usable].reshape(-1, frame_samples)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+def find_chunks(audio, sample_rate=SAMPLE_RATE, chunk_seconds=CHUNK_SECONDS, search_seconds=10, frame_ms=30):
+    # Cut near every chunk_seconds, at the quietest frame within search_seconds of the target
+    total = len(audio)
+    chunk_samples = int(chunk_seconds * sample_rate)
+    if total <= chunk_samples * 1.5:
+        return [(0, total)]
+
+    frame_samples = int(sample_rate * frame_ms / 1000)
+    energy = frame_energy(audio, frame_samples)
+    # Smooth over ~300 ms so we land inside a pause rather than between two syllables
+    window = max(1, 300 // frame_ms)
+    energy = np.convolve(energy, np.ones(window) / window, mode="same")
+    search = int(search_seconds * sample_rate / frame_samples)
+
+    cuts = [0]
+    target = chunk_samples
+    while target < total - chunk_samples // 2:
+        center = target // frame_samples
+        lo, hi = max(0, center - search), min(len(energy), center + search)
+        if hi <= lo:
+            break
+        cut = (lo + int(np.argmin(energy[lo:hi]))) * frame_samples
+        if cut <= cuts[-1]:
+            cut = target
+        cuts.append(cut)
+        target = cut + chunk_samples
+    cuts.append(total)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+# Workers
+
+_worker_model = None
+
+def init_worker(model_size, device, threads):
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = load_whisper(model_size, device)
+
+def detect_language_worker(audio):
+    import whisper
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), _worker_model.dims.n_mels).to(_worker_model.device)
+    _, probs = _worker_model.detect_language(mel)
+    return max(probs, key=probs.get)
+
+def window_segments(segments, duration, offset):
+    # Whisper pads every window to 30 s and may time the last segment past the real audio; clamp before shifting
+    shifted = []
+    for seg in segments:
+        start, end = min(seg["start"], duration), min(seg["end"], duration)
+        if seg["text"].strip() and end > start:
+            shifted.append({"start": start + offset, "end": end + offset, "text": seg["text"]})
+    return shifted
+
+def transcribe_chunk_worker(audio, language, offset):
+    result = _worker_model.transcribe(audio, language=language, condition_on_previous_text=False)
+    return window_segments(result["segments"], len(audio) / SAMPLE_RATE, offset)
+
+# Transcription
+
+def plan_replicas(model_size, replicas=None, budget_bytes=DEFAULT_BUDGET):
+    replicas = replicas or MAX_REPLICAS
+    # Every replica holds its own copy of the weights, so keep them inside the RAM budget; the registry
+    # trims a new pool further to what the models already loaded leave free
+    model_bytes = MODEL_BYTES.get(model_size, 0)
+    if model_bytes:
+        replicas = min(replicas, max(1, int(budget_bytes // model_bytes)))
+    return max(1, replicas)
+
+def should_chunk(duration, device, replicas=None):
+    return device == "cpu" and duration >= MIN_CHUNKED_DURATION and (replicas or MAX_REPLICAS) > 1
+
+def trim_overlap(segments, last_end):
+    # Chunks meet at a silence; never let a segment start before the previous one ends
+    trimmed = []
+    for seg in segments:
+        if seg["start"] < last_end:
+            seg = dict(seg, start=last_end)
+            if seg["end"] <= seg["start"]:
+                continue
+        trimmed.append(seg)
+        last_end = seg["end"]
+    return trimmed, last_end
+
+def iter_transcribe(model, audio, language=None, chunk_seconds=30):
+    # Yields (segments, fraction done) window by window so later stages can start early
+    chunks = find_chunks(audio, chunk_seconds=chunk_seconds, search_seconds=5)
+    last_end = 0.0
+    prompt = None
+    for idx, (start, end) in enumerate(chunks):
+        result = model.transcribe(audio[start:end], language=language, initial_prompt=prompt)
+        # The first window decides the language for the rest of the file
+        language = language or result.get("language")
+        segments = window_segments(result["segments"], (end - start) / SAMPLE_RATE, start / SAMPLE_RATE)
+        segments, last_end = trim_overlap(segments, last_end)
+        prompt = result.get("text", "")[-200:] or None
+        yield segments, (idx + 1) / len(chunks)
+
+def start_replica_pool(model_size, device, replicas):
+    threads = max(1, (os.cpu_count() or 1) // replicas)
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=replicas, mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker, initargs=(model_size, device, threads)
+    )
+
+def iter_transcribe_chunked(audio, model_size, device="cpu", language=None, replicas=None, detected=None):
+    # Yields (segments, fraction done) in timeline order as the replicas finish their chunks
+    chunks = find_chunks(audio)
+    # The registry keeps the pool and its replicas' weights within the RAM budget shared with every other job
+    with get_registry().acquire_pool(model_size, device, plan_replicas(model_size, replicas), start_replica_pool) as executor:
+        # Detect the language once so every chunk is decoded the same way
+        if language is None:
+            language = executor.submit(detect_language_worker, audio[:chunks[0][1]]).result()
+        if detected is not None:
+            detected["language"] = language
+
+        futures = [executor.submit(transcribe_chunk_worker, audio[start:end], language, start / SAMPLE_RATE)
+                   for start, end in chunks]
+        try:
+            last_end = 0.0
+            for idx, future in enumerate(futures):
+                segments, last_end = trim_overlap(future.result(), last_end)
+                yield segments, (idx + 1) / len(chunks)
+        finally:
+            # A cancelled job (or a reader that stopped early) drops its queued chunks instead of waiting for them;
+            # the pool is shared, so a chunk a replica is already decoding finishes in the background
+            for future in futures:
+                future.cancel()
+
+def transcribe_chunked(audio, model_size, device="cpu", language=None, replicas=None, progress_callback=None):
+    detected = {}
+    segments = []
+    for chunk_segments, done in iter_transcribe_chunked(audio, model_size, device, language, replicas, detected):
+        segments.extend(chunk_segments)
+        if progress_callback:
+            progress_callback(done)
+    for idx, seg in enumerate(segments):
+        seg["id"] = idx
+    return {"segments": segments, "language": detected.get("language", language), "text": "".join(seg["text"] for seg in segments)}
@@ -0,0 +1,177 @@
+import os                      # For store location and admission settings
+import time                    # For sample timestamps and elapsed time
+import sqlite3                 # Measured throughput survives restarts
+import threading               # Samples arrive from every job worker
+
+
+STORE_PATH = os.environ.get("ETA_STORE_PATH", os.path.join("output", "throughput.sqlite"))
+# Weight of the newest sample in the rolling average
+SMOOTHING = 0.3
+# Jobs whose queue wait plus ETA exceeds this are refused. Off (0) by default: an hour of audio on a CPU
+# medium/large model legitimately takes longer than any fixed limit that would still catch runaway jobs
+MAX_JOB_SECONDS = float(os.environ.get("MAX_JOB_SECONDS", 0))
+
+# Starting points until this machine has measured its own throughput
+DEFAULT_RATES = {
+    # Audio seconds per wall second on CPU, the old fixed speed table inverted
+    "transcribe": {"tiny": 1.0, "base": 0.67, "small": 0.5, "medium": 0.29, "large": 0.2},
+    "translate": 10.0,          # segments per second
+    "segment_density": 0.25,    # segments per audio second
+    "render": 15.0,             # megapixel-frames per second
+    "mux": 50.0,                # megabytes per second
+}
+CUDA_SPEEDUP = 4.0
+
+# Plan steps cover the progress bands run_pipeline reports
+STREAMING_BANDS = [("streaming", 5, 85), ("rendering", 85, 100)]
+BATCH_BANDS = [("transcribing", 5, 45), ("translating", 45, 85), ("rendering", 85, 100)]
+
+class ThroughputStore:
+    def __init__(self, path=STORE_PATH):
+        self.lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS throughput (
+                stage TEXT NOT NULL,
+                key TEXT NOT NULL,
+                rate REAL NOT NULL,
+                samples INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (stage, key)
+            )
+        """)
+        self.db.commit()
+
+    def record(self, stage, key, work, seconds):
+        # work is in the stage's own unit: audio seconds, segments, megapixel-frames or megabytes
+        if work <= 0 or seconds <= 0:
+            return
+        rate = work / seconds
+        with self.lock:
+            row = self.db.execute("SELECT rate, samples FROM throughput WHERE stage = ? AND key = ?", (stage, key)).fetchone()
+            if row is not None:
+                rate = row[0] + SMOOTHING * (rate - row[0])
+            self.db.execute(
+                "INSERT OR REPLACE INTO throughput (stage, key, rate, samples, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (stage, key, rate, (row[1] if row else 0) + 1, time.time())
+            )
+            self.db.commit()
+
+    def rate(self, stage, key, default, related=None):
+        with self.lock:
+            row = self.db.execute("SELECT rate FROM throughput WHERE stage = ? AND key = ?", (stage, key)).fetchone()
+            if row is None and related:
+                # A comparable key (say another preset of the same engine) beats a guess; callers only pass a
+                # pattern when its matches run at a similar speed, so cpu and cuda samples never mix
+                row = self.db.execute(
+                    "SELECT SUM(rate * samples) / SUM(samples) FROM throughput WHERE stage = ? AND key LIKE ?",
+                    (stage, related)
+                ).fetchone()
+        return row[0] if row and row[0] else default
+
+    def rates(self):
+        with self.lock:
+            rows = self.db.execute("SELECT stage, key, rate, samples, updated_at FROM throughput ORDER BY stage, key").fetchall()
+        return [{"stage": r[0], "key": r[1], "rate": r[2], "samples": r[3], "updated_at": r[4]} for r in rows]
+
+    # Learning
+
+    def learn_from_span(self, record):
+        # Called by telemetry for every finished span; only complete, uncached work says anything about speed
+        name, seconds = record["name"], record.get("duration", 0)
+        if record.get("status") != "ok" or record.get("cache_hit"):
+            return
+        if name in ("transcribe", "transcribe_translate") and record.get("audio_seconds"):
+            self.record(name, f"{record['model']}:{record['device']}", record["audio_seconds"], seconds)
+            if record.get("segments"):
+                self.record("segment_density", "", record["segments"], record["audio_seconds"])
+        elif name == "translate" and record.get("segments"):
+            self.record("translate", "", record["segments"], seconds)
+        elif name == "render" and record.get("frames") and record.get("pixels"):
+            # Rates are per output, so a multi-language render counts every encoded frame
+            work = record["frames"] * record["pixels"] * record.get("outputs", 1) / 1e6
+            self.record("render", f"{record.get('engine')}:{record.get('preset')}", work, seconds)
+        elif name == "mux" and record.get("bytes"):
+            self.record("mux", "", record["bytes"] / 1e6, seconds)
+
+    # Estimates
+
+    def transcribe_rate(self, stage, model_size, device):
+        default = DEFAULT_RATES["transcribe"].get(model_size, 0.5) * (CUDA_SPEEDUP if device == "cuda" else 1)
+        if stage == "transcribe_translate":
+            # Streaming overlaps translation with Whisper, so its rate starts from the plain transcribe rate
+            default = self.rate("transcribe", f"{model_size}:{device}", default)
+        return self.rate(stage, f"{model_size}:{device}", default)
+
+    def plan(self, params, media_info):
+        # Returns [{"stage", "seconds", "start", "end"}] for the job's progress bands
+        duration = media_info.get("duration") or 0
+        model_size, device = params.get("model_size", "medium"), params.get("device", "cpu")
+        targets = max(1, len(params.get("target_langs") or ()))
+        # Every language is translated and (when burned in) encoded; transcription happens once
+        segments = duration * self.rate("segment_density", "", DEFAULT_RATES["segment_density"]) * targets
+
+        if params.get("output_mode") == "soft":
+            size_mb = media_info.get("bytes", 0) / 1e6
+            render_seconds = size_mb / self.rate("mux", "", DEFAULT_RATES["mux"])
+        else:
+            frames = media_info.get("frame_count") or duration * (media_info.get("fps") or 25)
+            pixels = (media_info.get("width") or 1280) * (media_info.get("height") or 720)
+            engine = params.get("render_engine", "ffmpeg")
+            key = f"{engine}:{params.get('x264_preset', 'veryfast')}"
+            render_rate = self.rate("render", key, DEFAULT_RATES["render"], related=f"{engine}:%")
+            render_seconds = frames * pixels * targets / 1e6 / render_rate
+
+        if params.get("streaming", True) and targets == 1:
+            seconds = [duration / self.transcribe_rate("transcribe_translate", model_size, device), render_seconds]
+            bands = STREAMING_BANDS
+        else:
+            seconds = [duration / self.transcribe_rate("transcribe", model_size, device),
+                       segments / self.rate("translate", "", DEFAULT_RATES["translate"]),
+                       render_seconds]
+            bands = BATCH_BANDS
+        return [{"stage": stage, "seconds": round(sec, 2), "start": start, "end": end}
+                for (stage, start, end), sec in zip(bands, seconds)]
+
+def plan_total(plan):
+    return sum(step["seconds"] for step in plan)
+
+def remaining_seconds(plan, progress, elapsed=None):
+    # Steps behind the progress mark are done, the current one is pro-rated by its band
+    remaining = planned_done = 0.0
+    for step in plan:
+        if progress >= step["end"]:
+            planned_done += step["seconds"]
+        elif progress <= step["start"]:
+            remaining += step["seconds"]
+        else:
+            done = (progress - step["start"]) / (step["end"] - step["start"])
+            planned_done += step["seconds"] * done
+            remaining += step["seconds"] * (1 - done)
+    if elapsed and planned_done >= 5:
+        # Self-correct live: if this job is running slower or faster than planned, scale what is left
+        remaining *= min(4.0, max(0.25, elapsed / planned_done))
+    return remaining
+
+def admit(eta_seconds, backlog_seconds=0.0, max_seconds=MAX_JOB_SECONDS):
+    # Returns (admitted, reason)
+    if max_seconds and backlog_seconds + eta_seconds > max_seconds:
+        return False, (f"Estimated {int(eta_seconds // 60)} min of processing plus {int(backlog_seconds // 60)} min of queue "
+                       f"is over the {int(max_seconds // 60)} min limit. Try a faster model or a shorter file.")
+    return True, None
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_eta_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ThroughputStore()
+        return _store
+
+def learn_from_span(record):
+    get_eta_store().learn_from_span(record)
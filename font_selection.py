@@ -0,0 +1,184 @@
+import os                      # For locating font files
+import bisect                  # Codepoint -> script lookup in the sorted range table
+import functools               # LRU caches for font lookups and loaded fonts
+from collections import Counter  # For picking the dominant script of a text
+
+
+# Bundled fonts come first; SUBTITLE_FONT_DIRS and the system Noto directories cover the CJK
+# families, which are too large to ship in fonts/ (apt: fonts-noto-cjk)
+FONT_DIRS = [d for d in os.environ.get("SUBTITLE_FONT_DIRS", "").split(os.pathsep) if d] + [
+    "fonts",
+    "/usr/share/fonts/opentype/noto",
+    "/usr/share/fonts/truetype/noto",
+    "/usr/share/fonts/noto-cjk",
+    "/usr/share/fonts/google-noto-cjk",
+]
+DEFAULT_SCRIPT = "latin"
+
+# (first codepoint, last codepoint, script), sorted by first codepoint
+SCRIPT_RANGES = sorted([
+    (0x0041, 0x005A, "latin"), (0x0061, 0x007A, "latin"), (0x00C0, 0x024F, "latin"),
+    (0x0370, 0x03FF, "latin"), (0x0400, 0x052F, "latin"), (0x1E00, 0x1EFF, "latin"),
+    (0x0530, 0x058F, "armenian"),
+    (0x0590, 0x05FF, "hebrew"), (0xFB1D, 0xFB4F, "hebrew"),
+    (0x0600, 0x06FF, "arabic"), (0x0750, 0x077F, "arabic"), (0x08A0, 0x08FF, "arabic"),
+    (0xFB50, 0xFDFF, "arabic"), (0xFE70, 0xFEFF, "arabic"),
+    (0x0900, 0x097F, "devanagari"), (0xA8E0, 0xA8FF, "devanagari"),
+    (0x0980, 0x09FF, "bengali"),
+    (0x0A00, 0x0A7F, "gurmukhi"),
+    (0x0A80, 0x0AFF, "gujarati"),
+    (0x0B00, 0x0B7F, "oriya"),
+    (0x0B80, 0x0BFF, "tamil"),
+    (0x0C00, 0x0C7F, "telugu"),
+    (0x0C80, 0x0CFF, "kannada"),
+    (0x0D00, 0x0D7F, "malayalam"),
+    (0x0E00, 0x0E7F, "thai"),
+    (0x0E80, 0x0EFF, "lao"),
+    (0x1000, 0x109F, "myanmar"),
+    (0x10A0, 0x10FF, "georgian"),
+    (0x1100, 0x11FF, "korean"), (0x3130, 0x318F, "korean"), (0xAC00, 0xD7AF, "korean"),
+    (0x1200, 0x139F, "ethiopic"),
+    (0x1780, 0x17FF, "khmer"), (0x19E0, 0x19FF, "khmer"),
+    (0x3040, 0x30FF, "japanese"), (0x31F0, 0x31FF, "japanese"), (0xFF66, 0xFF9F, "japanese"),
+    (0x3400, 0x4DBF, "han"), (0x4E00, 0x9FFF, "han"), (0xF900, 0xFAFF, "han"),
+])
+_RANGE_STARTS = [first for first, _, _ in SCRIPT_RANGES]
+
+# Candidate files per script, best first; .ttc collections pick their face from TTC_FACES
+SCRIPT_FONTS = {
+    "latin": ["NotoSans-Regular.ttf"],
+    "arabic": ["NotoSansArabic-Regular.ttf"],
+    "hebrew": ["NotoSansHebrew-Regular.ttf"],
+    "armenian": ["NotoSansArmenian-Regular.ttf"],
+    "devanagari": ["NotoSansDevanagari-Regular.ttf"],
+    "bengali": ["NotoSansBengali-Regular.ttf"],
+    "gurmukhi": ["NotoSansGurmukhi-Regular.ttf"],
+    "gujarati": ["NotoSansGujarati-Regular.ttf"],
+    "oriya": ["NotoSansOriya-Regular.ttf"],
+    "tamil": ["NotoSansTamil-Regular.ttf"],
+    "telugu": ["NotoSansTelugu-Regular.ttf"],
+    "kannada": ["NotoSansKannada-Regular.ttf"],
+    "malayalam": ["NotoSansMalayalam-Regular.ttf"],
+    "thai": ["NotoSansThai-Regular.ttf"],
+    "lao": ["NotoSansLao-Regular.ttf"],
+    "myanmar": ["NotoSansMyanmar-Regular.ttf"],
+    "georgian": ["NotoSansGeorgian-Regular.ttf"],
+    "ethiopic": ["NotoSansEthiopic-Regular.ttf"],
+    "khmer": ["NotoSansKhmer-Regular.ttf"],
+    "japanese": ["NotoSansCJKjp-Regular.otf", "NotoSansJP-Regular.ttf", "NotoSansCJK-Regular.ttc"],
+    "korean": ["NotoSansCJKkr-Regular.otf", "NotoSansKR-Regular.ttf", "NotoSansCJK-Regular.ttc"],
+    "han": ["NotoSansSC-Regular.ttf", "NotoSansCJKsc-Regular.otf", "NotoSansCJK-Regular.ttc"],
+}
+TTC_FACES = {"japanese": 0, "korean": 1, "han": 2}
+
+# Script detection
+
+def script_of(char):
+    # None for characters shared by every script: spaces, digits, punctuation, symbols
+    cp = ord(char)
+    i = bisect.bisect_right(_RANGE_STARTS, cp) - 1
+    if i >= 0 and cp <= SCRIPT_RANGES[i][1]:
+        return SCRIPT_RANGES[i][2]
+    return None
+
+class ScriptTable(dict):
+    # char -> script memo in front of the bisect lookup, so map() over a line runs at C speed
+    def __missing__(self, char):
+        script = self[char] = script_of(char)
+        return script
+
+_scripts = ScriptTable()
+
+def split_runs(text):
+    # [(script, substring), ...]; shared characters join the run they sit in
+    if text.isascii():
+        return [(DEFAULT_SCRIPT, text)] if text else []
+    scripts = list(map(_scripts.__getitem__, text))
+    present = set(scripts)
+    # Kanji in a Japanese or Korean line belong with the kana/hangul font, not the Chinese one
+    han_as = "japanese" if "japanese" in present else "korean" if "korean" in present else "han"
+
+    runs = []
+    leading = ""
+    for char, script in zip(text, scripts):
+        if script == "han":
+            script = han_as
+        if script is None:
+            if runs:
+                runs[-1][1].append(char)
+            else:
+                leading += char
+        elif runs and runs[-1][0] == script:
+            runs[-1][1].append(char)
+        else:
+            runs.append((script, [leading + char]))
+            leading = ""
+    if not runs:
+        return [(DEFAULT_SCRIPT, leading)] if leading else []
+    return [(script, "".join(chars)) for script, chars in runs]
+
+def dominant_script(texts):
+    # One pass over all the text; Counter and map keep the per-character work in C
+    text = "".join(texts)
+    if text.isascii():
+        return DEFAULT_SCRIPT
+    counts = Counter(map(_scripts.__getitem__, text))
+    counts.pop(None, None)
+    if "han" in counts and ("japanese" in counts or "korean" in counts):
+        counts["japanese" if "japanese" in counts else "korean"] += counts.pop("han")
+    return counts.most_common(1)[0][0] if counts else DEFAULT_SCRIPT
+
+# Font files
+
+@functools.lru_cache(maxsize=None)
+def resolve_font(script):
+    for name in SCRIPT_FONTS.get(script, []):
+        for font_dir in FONT_DIRS:
+            path = os.path.join(font_dir, name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+def font_for_script(script):
+    return resolve_font(script) or resolve_font(DEFAULT_SCRIPT) or os.path.join("fonts", SCRIPT_FONTS[DEFAULT_SCRIPT][0])
+
+def face_index(path, script):
+    return TTC_FACES.get(script, 0) if path.lower().endswith(".ttc") else 0
+
+def get_font_for_text(text):
+    return font_for_script(dominant_script([text]))
+
+def get_font_for_segments(segments):
+    # The primary font for ASS styles and libass, chosen from all segments rather than the first
+    return font_for_script(dominant_script(seg["text"] for seg in segments))
+
+def get_face_for_segments(segments, path):
+    # The face of a .ttc collection (Noto CJK packs JP, KR, SC and TC in one file) that goes with get_font_for_segments
+    return face_index(path, dominant_script(seg["text"] for seg in segments))
+
+def missing_fonts():
+    # Scripts that would fall back to the Latin font (and render as empty boxes)
+    return sorted(script for script in SCRIPT_FONTS if resolve_font(script) is None)
+
+def report_missing_fonts():
+    missing = missing_fonts()
+    if missing:
+        print(f"⚠️ No font found for: {', '.join(missing)}. Add them to fonts/ or SUBTITLE_FONT_DIRS "
+              f"(CJK: install fonts-noto-cjk).")
+    return missing
+
+# Loaded fonts
+
+@functools.lru_cache(maxsize=64)
+def load_font(path, size, index=0):
+    # FreeTypeFont objects are immutable once loaded, so one per (path, size, face) is shared
+    from PIL import ImageFont
+    return ImageFont.truetype(path, size, index=index)
+
+def fonts_for_runs(runs, size, fallback_path=None):
+    # [(FreeTypeFont, substring), ...] for drawing a line run by run
+    fonts = []
+    for script, run in runs:
+        path = resolve_font(script) or fallback_path or font_for_script(script)
+        fonts.append((load_font(path, size, face_index(path, script)), run))
+    return fonts
@@ -0,0 +1,222 @@
+import os                      # For queue file location
+import json                    # Job parameters and results are stored as JSON
+import time                    # For timestamps and worker polling
+import uuid                    # For job ids
+import sqlite3                 # Local persistent queue backend
+import threading               # Worker pool and shared connection lock
+import traceback               # For recording failures
+from telemetry import metrics, Cancelled
+
+
+QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", os.path.join("output", "jobs.sqlite"))
+ACTIVE_STATUSES = ("queued", "running")
+
+class JobCancelled(Cancelled):
+    pass
+
+def active_upload_paths(path=QUEUE_PATH):
+    # Uploads of queued and running jobs must survive quota sweeps; opens its own connection so
+    # other processes (batch runs) can ask too
+    if path != ":memory:" and not os.path.exists(path):
+        return []
+    db = sqlite3.connect(path)
+    try:
+        rows = db.execute(
+            f"SELECT params FROM jobs WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))})", ACTIVE_STATUSES
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        db.close()
+    return [path for path in (json.loads(row[0]).get("upload_path") for row in rows) if path]
+
+class JobQueue:
+    def __init__(self, handler, path=QUEUE_PATH, workers=2, poll_interval=1.0, report_interval=0.5):
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self.report_interval = report_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                params TEXT NOT NULL,
+                result TEXT,
+                preview TEXT,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        if "preview" not in [col[1] for col in self.db.execute("PRAGMA table_info(jobs)")]:
+            self.db.execute("ALTER TABLE jobs ADD COLUMN preview TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority, created_at)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_username ON jobs (username, created_at)")
+        # Jobs that were running when the process died start over
+        self.db.execute("UPDATE jobs SET status = 'queued', stage = NULL, progress = 0 WHERE status = 'running'")
+        self.db.commit()
+
+        self.threads = [threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    # Public API
+
+    def submit(self, username, params, priority=0):
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO jobs (id, username, priority, status, stage, params, created_at) VALUES (?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, username, priority, json.dumps(params), time.time())
+            )
+            self.db.commit()
+        self.wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, username, statuses=None, limit=20):
+        query = "SELECT * FROM jobs WHERE username = ?"
+        args = [username]
+        if statuses:
+            query += f" AND status IN ({','.join('?' * len(statuses))})"
+            args += list(statuses)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with self.lock:
+            rows = self.db.execute(query, args).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def active_jobs(self):
+        # Every queued or running job across users, oldest first
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT * FROM jobs WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))}) ORDER BY created_at", ACTIVE_STATUSES
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def queue_position(self, job_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < (SELECT created_at FROM jobs WHERE id = ?)", (job_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def cancel(self, job_id):
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = 'cancelled', stage = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self.db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            self.db.commit()
+
+    def shutdown(self, wait=True):
+        self.stopping.set()
+        self.wakeup.set()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    # Workers
+
+    def _claim_next(self):
+        # Fairness: users with the fewest running jobs go first, then priority, then
+        # round-robin by whoever was served least recently, then age
+        with self.lock:
+            row = self.db.execute("""
+                SELECT j.* FROM jobs j
+                LEFT JOIN (
+                    SELECT username,
+                           SUM(CASE WHEN status = 'running' THEN 1 ELSE 0 END) AS running,
+                           MAX(started_at) AS last_started
+                    FROM jobs WHERE started_at IS NOT NULL GROUP BY username
+                ) u ON u.username = j.username
+                WHERE j.status = 'queued'
+                ORDER BY COALESCE(u.running, 0), j.priority DESC, COALESCE(u.last_started, 0), j.created_at
+                LIMIT 1
+            """).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE jobs SET status = 'running', stage = 'starting', started_at = ? WHERE id = ?", (time.time(), row["id"])
+            )
+            self.db.commit()
+        return self._to_dict(row)
+
+    def _make_reporter(self, job_id):
+        last_write = [0.0]
+
+        def report(stage, progress, preview=None):
+            now = time.time()
+            # Per-frame callbacks are throttled; cancellation is checked whenever progress is written
+            if now - last_write[0] >= self.report_interval or progress >= 100 or preview is not None:
+                last_write[0] = now
+                with self.lock:
+                    self.db.execute("UPDATE jobs SET stage = ?, progress = ? WHERE id = ?", (stage, float(progress), job_id))
+                    if preview is not None:
+                        self.db.execute("UPDATE jobs SET preview = ? WHERE id = ?", (json.dumps(preview), job_id))
+                    self.db.commit()
+                    cancelled = self.db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+                if cancelled:
+                    raise JobCancelled(job_id)
+
+        return report
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, stage = ?, progress = CASE WHEN ? = 'done' THEN 100 ELSE progress END, "
+                "result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, status, status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+            self.db.commit()
+
+    def _worker(self):
+        while not self.stopping.is_set():
+            job = self._claim_next()
+            if job is None:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            started = time.time()
+            metrics.observe("job_queue_wait_seconds", started - job["created_at"])
+            status = "failed"
+            try:
+                result = self.handler(job, self._make_reporter(job["id"]))
+                status = "done"
+                self._finish(job["id"], "done", result=result)
+            except JobCancelled:
+                status = "cancelled"
+                self._finish(job["id"], "cancelled")
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job["id"], "failed", error=str(e) or e.__class__.__name__)
+            finally:
+                metrics.incr("jobs_total", status=status)
+                metrics.observe("job_duration_seconds", time.time() - started, status=status)
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["preview"] = json.loads(job["preview"]) if job.get("preview") else []
+        return job
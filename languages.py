@@ -0,0 +1,107 @@
+import os                      # For the cache path and refresh settings
+import time                    # For ageing out the refreshed table
+import json                    # The refreshed table is cached on disk as JSON
+import threading               # Refreshes run in the background so startup never waits on the network
+
+
+# Bundled copy of Google Translate's language table; bump the version whenever it is regenerated
+BUNDLED_VERSION = "2024.06"
+BUNDLED_LANGUAGES = {
+    "afrikaans": "af", "albanian": "sq", "amharic": "am", "arabic": "ar", "armenian": "hy",
+    "assamese": "as", "aymara": "ay", "azerbaijani": "az", "bambara": "bm", "basque": "eu",
+    "belarusian": "be", "bengali": "bn", "bhojpuri": "bho", "bosnian": "bs", "bulgarian": "bg",
+    "catalan": "ca", "cebuano": "ceb", "chichewa": "ny", "chinese (simplified)": "zh-CN",
+    "chinese (traditional)": "zh-TW", "corsican": "co", "croatian": "hr", "czech": "cs",
+    "danish": "da", "dhivehi": "dv", "dogri": "doi", "dutch": "nl", "english": "en",
+    "esperanto": "eo", "estonian": "et", "ewe": "ee", "filipino": "tl", "finnish": "fi",
+    "french": "fr", "frisian": "fy", "galician": "gl", "georgian": "ka", "german": "de",
+    "greek": "el", "guarani": "gn", "gujarati": "gu", "haitian creole": "ht", "hausa": "ha",
+    "hawaiian": "haw", "hebrew": "iw", "hindi": "hi", "hmong": "hmn", "hungarian": "hu",
+    "icelandic": "is", "igbo": "ig", "ilocano": "ilo", "indonesian": "id", "irish": "ga",
+    "italian": "it", "japanese": "ja", "javanese": "jw", "kannada": "kn", "kazakh": "kk",
+    "khmer": "km", "kinyarwanda": "rw", "konkani": "gom", "korean": "ko", "krio": "kri",
+    "kurdish (kurmanji)": "ku", "kurdish (sorani)": "ckb", "kyrgyz": "ky", "lao": "lo",
+    "latin": "la", "latvian": "lv", "lingala": "ln", "lithuanian": "lt", "luganda": "lg",
+    "luxembourgish": "lb", "macedonian": "mk", "maithili": "mai", "malagasy": "mg",
+    "malay": "ms", "malayalam": "ml", "maltese": "mt", "maori": "mi", "marathi": "mr",
+    "meiteilon (manipuri)": "mni-Mtei", "mizo": "lus", "mongolian": "mn", "myanmar": "my",
+    "nepali": "ne", "norwegian": "no", "odia (oriya)": "or", "oromo": "om", "pashto": "ps",
+    "persian": "fa", "polish": "pl", "portuguese": "pt", "punjabi": "pa", "quechua": "qu",
+    "romanian": "ro", "russian": "ru", "samoan": "sm", "sanskrit": "sa", "scots gaelic": "gd",
+    "sepedi": "nso", "serbian": "sr", "sesotho": "st", "shona": "sn", "sindhi": "sd",
+    "sinhala": "si", "slovak": "sk", "slovenian": "sl", "somali": "so", "spanish": "es",
+    "sundanese": "su", "swahili": "sw", "swedish": "sv", "tajik": "tg", "tamil": "ta",
+    "tatar": "tt", "telugu": "te", "thai": "th", "tigrinya": "ti", "tsonga": "ts",
+    "turkish": "tr", "turkmen": "tk", "twi": "ak", "ukrainian": "uk", "urdu": "ur",
+    "uyghur": "ug", "uzbek": "uz", "vietnamese": "vi", "welsh": "cy", "xhosa": "xh",
+    "yiddish": "yi", "yoruba": "yo", "zulu": "zu",
+}
+
+CACHE_PATH = os.path.join("output", "languages.json")
+REFRESH_MAX_AGE = int(os.environ.get("LANGUAGE_REFRESH_MAX_AGE", 7 * 24 * 3600))
+# "off" keeps boot fully offline; "background" refreshes a stale table without blocking startup
+REFRESH_MODE = os.environ.get("LANGUAGE_REFRESH", "background")
+
+_table = None
+_lock = threading.Lock()
+_refreshing = False
+
+def load_cached_table(path=CACHE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        if table.get("languages"):
+            return table
+    except (OSError, ValueError):
+        pass
+    return None
+
+def get_language_table():
+    global _table
+    with _lock:
+        if _table is None:
+            _table = load_cached_table() or {"version": BUNDLED_VERSION, "fetched_at": 0, "languages": BUNDLED_LANGUAGES}
+        return _table
+
+def get_lang_dict():
+    # Display name -> language code, as shown in the language pickers
+    return {name.title(): code for name, code in get_language_table()["languages"].items()}
+
+def fetch_languages():
+    from deep_translator import GoogleTranslator
+    return GoogleTranslator().get_supported_languages(as_dict=True)
+
+def refresh_languages(path=CACHE_PATH):
+    global _table, _refreshing
+    try:
+        languages = fetch_languages()
+        if not languages:
+            return None
+        table = {"version": time.strftime("%Y.%m.%d"), "fetched_at": time.time(), "languages": languages}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(table, f)
+        os.replace(tmp_path, path)
+        with _lock:
+            _table = table
+        return table
+    except Exception as e:
+        # Keep serving the table we already have; the next boot tries again
+        print(f"Language table refresh failed: {e}")
+        return None
+    finally:
+        with _lock:
+            _refreshing = False
+
+def refresh_in_background(mode=None, max_age=REFRESH_MAX_AGE):
+    global _refreshing
+    mode = mode or REFRESH_MODE
+    if mode == "off" or time.time() - get_language_table().get("fetched_at", 0) < max_age:
+        return False
+    with _lock:
+        if _refreshing:
+            return False
+        _refreshing = True
+    threading.Thread(target=refresh_languages, daemon=True).start()
+    return True
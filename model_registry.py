@@ -0,0 +1,178 @@
+import os                      # For the cache directory and memory budget settings
+import gc                      # To release evicted model weights promptly
+import time                    # For least-recently-used bookkeeping
+import threading               # Registry is shared by every session and job worker
+import concurrent.futures      # For spotting a replica pool that lost a worker
+from contextlib import contextmanager
+
+
+# Approximate fp32 weight sizes, used to make room before a model is loaded
+MODEL_BYTES = {
+    "tiny": 151 * 1024 ** 2,
+    "base": 290 * 1024 ** 2,
+    "small": 967 * 1024 ** 2,
+    "medium": 3 * 1024 ** 3,
+    "large": 6 * 1024 ** 3,
+}
+DEFAULT_BUDGET = float(os.environ.get("WHISPER_RAM_BUDGET_GB", 8)) * 1024 ** 3
+
+def load_whisper(model_size, device):
+    import whisper
+    os.environ["WHISPER_CACHE_DIR"] = os.path.expanduser("~/.cache/whisper")
+    return whisper.load_model(model_size, device=device)
+
+def measure_model_bytes(model):
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except AttributeError:
+        return 0
+
+class ModelRegistry:
+    def __init__(self, budget_bytes=DEFAULT_BUDGET, loader=load_whisper):
+        self.budget_bytes = budget_bytes
+        self.loader = loader
+        self.lock = threading.Condition()
+        # key -> [{"model", "bytes", "refs", "last_used"}]; busy models get a second instance when it fits
+        self.entries = {}
+        # key -> instances being loaded, and device -> their expected bytes so parallel loads share the budget
+        self.loading = {}
+        self.reserved = {}
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0, "waits": 0}
+
+    @contextmanager
+    def acquire(self, model_size, device="cpu"):
+        # Lending is exclusive: Whisper installs kv-cache hooks on the model during decoding, so two callers
+        # sharing one instance corrupt each other's output. Another instance is loaded when the budget has
+        # room for it; otherwise the caller waits for one to come back. Borrowed models are never evicted
+        key = (model_size, device)
+        model_bytes = MODEL_BYTES.get(model_size, 0)
+        entry = self._checkout(key, lambda free: model_bytes, lambda size: self.loader(model_size, device))
+        try:
+            yield entry["model"]
+        finally:
+            self._checkin(key, entry)
+
+    @contextmanager
+    def acquire_pool(self, model_size, device, replicas, start_pool):
+        # A process pool with one model copy per worker, for chunked transcription. It outlives the job so only
+        # the first one pays for loading the replicas, and concurrent jobs share it (every task runs on one
+        # worker's own model). A new pool gets as many replicas as fit next to the other models on the device
+        key = (model_size, device, "pool")
+        model_bytes = MODEL_BYTES.get(model_size, 0)
+
+        def pool_bytes(free):
+            return min(replicas, max(1, int(free // model_bytes))) * model_bytes if model_bytes else 0
+
+        def load(size):
+            return start_pool(model_size, device, size // model_bytes if model_bytes else replicas)
+
+        entry = self._checkout(key, pool_bytes, load, shared=True, close=lambda pool: pool.shutdown(wait=False, cancel_futures=True))
+        try:
+            yield entry["model"]
+        except concurrent.futures.BrokenExecutor:
+            # A replica died (OOM kill, crash in a codec); the next job starts a fresh pool
+            entry["broken"] = True
+            raise
+        finally:
+            self._checkin(key, entry)
+
+    def warm(self, keys):
+        for model_size, device in keys:
+            with self.acquire(model_size, device):
+                pass
+
+    def loaded(self):
+        with self.lock:
+            return {key: [{"bytes": e["bytes"], "refs": e["refs"], "last_used": e["last_used"]} for e in entries]
+                    for key, entries in self.entries.items()}
+
+    def total_bytes(self, device=None):
+        return sum(e["bytes"] for key, entries in self.entries.items() if device is None or key[1] == device for e in entries)
+
+    def _checkout(self, key, size_for, load, shared=False, close=None):
+        # size_for(free bytes) -> bytes a new instance needs; load(those bytes) -> the instance
+        device = key[1]
+        with self.lock:
+            while True:
+                usable = [e for e in self.entries.get(key, []) if shared or e["refs"] == 0]
+                if usable:
+                    entry = max(usable, key=lambda e: e["last_used"])
+                    entry["refs"] += 1
+                    self.stats["hits"] += 1
+                    return entry
+                # The first instance is always loaded; further ones only when they fit once idle models are gone.
+                # Shared instances are never doubled up, so those wait for the load in progress
+                loading = self.loading.get(key)
+                free = self.budget_bytes - self._used_bytes(device) + self._idle_bytes(device)
+                size = size_for(free)
+                if not (shared and loading) and ((not self.entries.get(key) and not loading) or size <= free):
+                    self._evict(device, size)
+                    break
+                self.stats["waits"] += 1
+                self.lock.wait()
+            self.loading[key] = (loading or 0) + 1
+            self.reserved[device] = self.reserved.get(device, 0) + size
+
+        try:
+            model = load(size)
+        finally:
+            with self.lock:
+                self.loading[key] -= 1
+                self.reserved[device] -= size
+                self.lock.notify_all()
+
+        with self.lock:
+            entry = {"model": model, "bytes": measure_model_bytes(model) or size, "refs": 1, "last_used": time.time(), "close": close}
+            self.entries.setdefault(key, []).append(entry)
+            self.stats["loads"] += 1
+            self._evict(device, 0)
+            return entry
+
+    def _checkin(self, key, entry):
+        with self.lock:
+            entry["refs"] -= 1
+            entry["last_used"] = time.time()
+            if entry.get("broken") and entry in self.entries.get(key, []):
+                self._remove(key, entry)
+            self.lock.notify_all()
+
+    def _used_bytes(self, device):
+        return self.total_bytes(device) + self.reserved.get(device, 0)
+
+    def _idle_bytes(self, device):
+        return sum(e["bytes"] for key, entries in self.entries.items() if key[1] == device for e in entries if e["refs"] == 0)
+
+    def _evict(self, device, incoming_bytes):
+        # Drop idle models on the same device, least recently used first, until the budget fits
+        idle = sorted((e["last_used"], id(e), key, e) for key, entries in self.entries.items() if key[1] == device
+                      for e in entries if e["refs"] == 0)
+        evicted = False
+        for _, _, key, entry in idle:
+            if self._used_bytes(device) + incoming_bytes <= self.budget_bytes:
+                break
+            self._remove(key, entry)
+            self.stats["evictions"] += 1
+            evicted = True
+        if evicted:
+            gc.collect()
+            if device == "cuda":
+                import torch
+                torch.cuda.empty_cache()
+
+    def _remove(self, key, entry):
+        self.entries[key].remove(entry)
+        if not self.entries[key]:
+            del self.entries[key]
+        if entry["close"]:
+            entry["close"](entry["model"])
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,216 @@
+import os                      # For file paths
+from contextlib import ExitStack
+from subtitle_generator import get_font_for_segments, export_srt, SrtWriter, burn_tracks, mux_soft_subtitle_tracks, export_sidecars, probe_media, decode_audio
+from translation import translate_segments_multi, translate_stream, FAILED_TRANSLATION
+from translation_cache import get_default_cache
+from artifact_store import store_file, new_work_path, file_digest
+from transcript_cache import get_transcript_cache
+from model_registry import get_registry
+from chunked_transcription import transcribe_chunked, iter_transcribe, iter_transcribe_chunked, should_chunk, SAMPLE_RATE
+from telemetry import span, add_span_listener
+from eta_store import learn_from_span
+
+
+# A cached transcript arrives all at once; it is handed on in slices so the translation pool can work in parallel
+CACHED_BATCH_SEGMENTS = 50
+
+# Finished spans feed the measured throughput behind the ETAs
+add_span_listener(learn_from_span)
+
+
+# Transcription
+
+def use_chunked(audio, params):
+    mode = params.get("transcription_mode", "auto")
+    return mode == "chunked" or (mode == "auto" and should_chunk(len(audio) / SAMPLE_RATE, params["device"]))
+
+def load_audio(upload_path):
+    with span("decode_audio", bytes=os.path.getsize(upload_path)) as s:
+        audio = decode_audio(upload_path)
+        s["seconds"] = round(len(audio) / SAMPLE_RATE, 3)
+        return audio
+
+def transcribe_audio(upload_path, params, report):
+    with span("transcribe", model=params["model_size"], device=params["device"], audio_seconds=params.get("media_duration")) as s:
+        cached = get_transcript_cache().get(params["media_hash"], params["model_size"], params.get("spoken_lang"))
+        s["cache_hit"] = cached is not None
+        if cached is not None:
+            s["segments"] = len(cached)
+            return {"segments": cached}
+        transcription = transcribe_uncached(load_audio(upload_path), params, report)
+        s["segments"] = len(transcription["segments"])
+    get_transcript_cache().put(params["media_hash"], params["model_size"], params.get("spoken_lang"), transcription["segments"])
+    return transcription
+
+def transcribe_uncached(audio, params, report):
+    if use_chunked(audio, params):
+        # Long CPU jobs are split at silences and transcribed by a pool of model replicas
+        report("transcribing", 20)
+        return transcribe_chunked(audio, params["model_size"], params["device"], language=params.get("spoken_lang"),
+                                  progress_callback=lambda done: report("transcribing", 20 + done * 25))
+    with ExitStack() as stack:
+        with span("load_model", model=params["model_size"], device=params["device"]):
+            model = stack.enter_context(get_registry().acquire(params["model_size"], params["device"]))
+        report("transcribing", 20)
+        return model.transcribe(audio, language=params.get("spoken_lang"))
+
+def iter_segment_batches(upload_path, params, info=None):
+    # A repeat upload with the same model and language skips Whisper entirely
+    cache = get_transcript_cache()
+    cached = cache.get(params["media_hash"], params["model_size"], params.get("spoken_lang"))
+    if info is not None:
+        info["cache_hit"] = cached is not None
+    if cached is not None:
+        for start in range(0, len(cached), CACHED_BATCH_SEGMENTS):
+            end = min(start + CACHED_BATCH_SEGMENTS, len(cached))
+            yield cached[start:end], end / len(cached)
+        if not cached:
+            yield cached, 1.0
+        return
+
+    segments = []
+    # Audio is only decoded when Whisper actually has to run
+    for batch, done in iter_uncached_batches(load_audio(upload_path), params):
+        segments.extend(batch)
+        yield batch, done
+    cache.put(params["media_hash"], params["model_size"], params.get("spoken_lang"), segments)
+
+def iter_uncached_batches(audio, params):
+    if use_chunked(audio, params):
+        yield from iter_transcribe_chunked(audio, params["model_size"], params["device"], language=params.get("spoken_lang"))
+    else:
+        with get_registry().acquire(params["model_size"], params["device"]) as model:
+            yield from iter_transcribe(model, audio, language=params.get("spoken_lang"))
+
+# Streaming
+
+def stream_subtitles(upload_path, params, srt_path, report, preview_size=5):
+    # Segments are translated while Whisper keeps decoding and appended to the SRT as they finish
+    report("streaming", 20)
+    translated_segments = []
+    with span("transcribe_translate", model=params["model_size"], device=params["device"], target=params["target_lang"],
+              audio_seconds=params.get("media_duration")) as s:
+        batches = translate_stream(iter_segment_batches(upload_path, params, s), params["target_lang"], cache=get_default_cache())
+        with SrtWriter(srt_path) as writer:
+            for segments, done in batches:
+                writer.append(segments)
+                translated_segments.extend(segments)
+                preview = [seg["text"] for seg in translated_segments[-preview_size:]]
+                report("streaming", 20 + done * 50, preview=preview)
+        s["segments"] = len(translated_segments)
+        s["failed_translations"] = sum(seg["text"] == FAILED_TRANSLATION for seg in translated_segments)
+    report("exporting", 70)
+    return translated_segments
+
+# Pipeline
+
+def target_languages(params):
+    # [(code, display name), ...]; target_langs fans one transcription out to several languages
+    codes = params.get("target_langs") or [params["target_lang"]]
+    names = params.get("target_names") or ([params.get("target_name")] if not params.get("target_langs") else codes)
+    targets = {}
+    for code, name in zip(codes, names):
+        targets.setdefault(code, name)
+    return list(targets.items())
+
+def translate_transcript(upload_path, params, tracks, report):
+    # Whisper runs once (or comes from the cache) however many languages are requested
+    transcription = transcribe_audio(upload_path, params, report)
+    segments = transcription["segments"]
+    report("translating", 45)
+    with span("translate", target=",".join(track["lang"] for track in tracks), targets=len(tracks),
+              segments=len(segments) * len(tracks)) as s:
+        translated = translate_segments_multi(segments, [track["lang"] for track in tracks], cache=get_default_cache(),
+                                              progress_callback=lambda done: report("translating", 45 + done * 25))
+        s["failed_translations"] = sum(seg["text"] == FAILED_TRANSLATION for result in translated.values() for seg in result)
+    report("exporting", 70)
+    with span("export_srt", segments=len(segments) * len(tracks)):
+        for track in tracks:
+            track["segments"] = translated[track["lang"]]
+            export_srt(track["segments"], track["srt_path"])
+
+def track_output_names(stem, lang, sidecars, multi, output_mode):
+    # With several languages the code goes into the file names: talk.de.srt, talk_de_subtitled.mp4
+    name = f"{stem}.{lang}" if multi else stem
+    # Soft subtitles put every language in one shared video
+    video_name = f"{stem}_{lang}_subtitled.mp4" if multi and output_mode != "soft" else f"{stem}_subtitled.mp4"
+    output_names = {"video": video_name, "srt": f"{name}.srt"}
+    output_names.update({fmt: f"{name}.{fmt}" for fmt in sidecars})
+    return output_names
+
+def run_pipeline(upload_path, params, report=None):
+    # params: spoken_lang (code or None), target_lang (code), target_name, model_size, device,
+    # transcription_mode (auto, single or chunked), streaming, output_mode, render_engine,
+    # x264_preset and stem (display name of the upload); target_langs and target_names request
+    # several languages, which share one transcription and one decode of the video
+    report = report or (lambda stage, progress, preview=None: None)
+    targets = target_languages(params)
+    with span("pipeline", streaming=params.get("streaming", True), output_mode=params.get("output_mode", "burned"),
+              targets=len(targets)) as pipeline_span:
+        with span("probe", bytes=os.path.getsize(upload_path)) as s:
+            media_info = probe_media(upload_path)
+            s.update(media_duration=media_info["duration"], frames=media_info["frame_count"])
+            params = dict(params, media_hash=params.get("media_hash") or file_digest(upload_path), media_duration=media_info["duration"])
+
+        report("loading_model", 5)
+        # One track per language: its segments, SRT, font and rendered output
+        tracks = [{"lang": code, "name": name, "srt_path": new_work_path(".srt")} for code, name in targets]
+
+        if params.get("streaming", True) and len(tracks) == 1:
+            tracks[0]["segments"] = stream_subtitles(upload_path, dict(params, target_lang=tracks[0]["lang"]), tracks[0]["srt_path"], report)
+        else:
+            translate_transcript(upload_path, params, tracks, report)
+
+        for track in tracks:
+            track["font_path"] = get_font_for_segments(track["segments"])
+
+        report("rendering", 85)
+        render_progress = lambda p: report("rendering", max(85, min(99, p)))
+        if params.get("output_mode") == "soft":
+            # Every language goes into the same file as its own selectable track
+            video_output_path = new_work_path(".mp4")
+            with span("mux", bytes=os.path.getsize(upload_path), outputs=len(tracks)):
+                for track in tracks:
+                    track["sidecars"] = export_sidecars(track["segments"], os.path.splitext(track["srt_path"])[0], track["font_path"],
+                                                        width=media_info["width"] or 384, height=media_info["height"] or 288)
+                    track.update(title=track["name"], output_path=video_output_path)
+                mux_soft_subtitle_tracks(upload_path, tracks, video_output_path, progress_callback=render_progress)
+        else:
+            for track in tracks:
+                track.update(sidecars={}, output_path=new_work_path(".mp4"))
+            with span("render", frames=media_info["frame_count"], pixels=media_info["width"] * media_info["height"], outputs=len(tracks),
+                      requested_engine=params.get("render_engine", "ffmpeg"), preset=params.get("x264_preset", "veryfast")) as s:
+                s["engine"] = burn_tracks(upload_path, tracks, engine=params.get("render_engine", "ffmpeg"),
+                                          preset=params.get("x264_preset", "veryfast"), progress_callback=render_progress)
+                s["bytes"] = sum(os.path.getsize(track["output_path"]) for track in tracks)
+
+        stem = params.get("stem", "subtitles")
+        with span("store"):
+            stored_videos = {}
+            outputs = []
+            for track in tracks:
+                output_names = track_output_names(stem, track["lang"], track["sidecars"], len(tracks) > 1, params.get("output_mode"))
+                if track["output_path"] not in stored_videos:
+                    stored_videos[track["output_path"]] = store_file(track["output_path"])
+                outputs.append({
+                    "lang": track["lang"],
+                    "name": track["name"],
+                    "srt_path": store_file(track["srt_path"]),
+                    "video_path": stored_videos[track["output_path"]],
+                    "sidecar_paths": {fmt: store_file(path) for fmt, path in track["sidecars"].items()},
+                    "output_names": output_names,
+                    "segment_count": len(track["segments"])
+                })
+            # The top-level paths are the first language's, as for a single-language job
+            result = {
+                "outputs": outputs,
+                "srt_path": outputs[0]["srt_path"],
+                "video_path": outputs[0]["video_path"],
+                "sidecar_paths": outputs[0]["sidecar_paths"],
+                "output_names": outputs[0]["output_names"],
+                "segment_count": outputs[0]["segment_count"],
+                "transcript_cache_hit_rate": get_transcript_cache().hit_rate(),
+                "duration": media_info["duration"]
+            }
+        pipeline_span.update(segments=outputs[0]["segment_count"], media_duration=media_info["duration"])
+        return result
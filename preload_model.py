@@ -1,8 +1,26 @@
 # preload_model.py
-import whisper
 import os
+import threading
+from model_registry import get_registry
 
-# Make sure it's cached in the same location
-os.environ["WHISPER_CACHE_DIR"] = os.path.expanduser("~/.cache/whisper")
-whisper.load_model("medium")  # Or 'tiny', 'large', etc.
-print("✅ Model preloaded and cached.")
+def parse_preload(spec):
+    # "medium:cpu,tiny" -> [("medium", "cpu"), ("tiny", "cpu")]
+    keys = []
+    for item in spec.split(","):
+        model_size, _, device = item.strip().partition(":")
+        if model_size:
+            keys.append((model_size, device or "cpu"))
+    return keys
+
+def warm_models(spec=None, background=False):
+    keys = parse_preload(spec if spec is not None else os.environ.get("WHISPER_PRELOAD", ""))
+    if background:
+        threading.Thread(target=get_registry().warm, args=(keys,), daemon=True).start()
+    else:
+        get_registry().warm(keys)
+    return keys
+
+if __name__ == "__main__":
+    # Make sure it's cached in the same location
+    warm_models(os.environ.get("WHISPER_PRELOAD", "medium"))  # Or 'tiny', 'large', etc.
+    print("✅ Model preloaded and cached.")
@@ -2,64 +2,104 @@ import os                      # For interacting with the operating system (file
 import tempfile                # To create temporary files and directories safely
 import subprocess              # To run external commands (e.g., ffmpeg) as subprocesses
 import threading               # For running tasks concurrently in threads (background processing)
+import multiprocessing         # For sharing progress between render worker processes
+import shutil                  # For cleaning up temporary render directories
 #import tkinter as tk           # Core Tkinter GUI module
 #from tkinter import filedialog, messagebox  # File dialogs and popup message boxes in Tkinter
 #from tkinter import ttk        # Themed Tkinter widgets (better styled widgets)
-import whisper                 # OpenAI Whisper speech-to-text model for transcription
 import srt                     # For handling subtitle (.srt) files (parsing and generation)
 from datetime import timedelta # For handling time durations, useful for subtitle timestamps
-import cv2                     # OpenCV for video processing and manipulation
 import textwrap                # For wrapping and formatting text (subtitle line wrapping)
 import numpy as np             # Numerical operations, image array manipulation
-from PIL import ImageFont, ImageDraw, Image  # Pillow (PIL) for drawing text and fonts on images (subtitles rendering)
-import re                      # Regular expressions, for pattern matching (e.g., font selection based on Unicode)
-from deep_translator import GoogleTranslator  # For translating text segments using Google Translate API
+import struct                  # For reading font metric tables (libass sizing)
+import json                    # For parsing ffprobe output
 import concurrent.futures      # For high-level concurrency, running translation or processing in parallel (threads or processes)
+import translation             # Batched translation engine with pluggable backends
+import telemetry               # Counts and logs ffmpeg failures
+from font_selection import get_font_for_text, get_font_for_segments, get_face_for_segments, split_runs, fonts_for_runs, load_font  # Script-aware fonts
 
 
-# Language setup
-SUPPORTED_LANGS = GoogleTranslator().get_supported_languages(as_dict=True)
-LANG_DICT = {name.title(): code for name, code in SUPPORTED_LANGS.items()}
-
-# Font selection
-def get_font_for_text(text):
-    if re.search(r'[\u0600-\u06FF]', text): return "fonts/NotoSansArabic-Regular.ttf"
-    elif re.search(r'[\u0590-\u05FF]', text): return "fonts/NotoSansHebrew-Regular.ttf"
-    elif re.search(r'[\u3040-\u30FF\u31F0-\u31FF]', text): return "fonts/NotoSansCJKjp-Regular.otf"
-    elif re.search(r'[\uAC00-\uD7AF]', text): return "fonts/NotoSansCJKkr-Regular.otf"
-    elif re.search(r'[\u4E00-\u9FFF]', text): return "fonts/NotoSansSC-Regular.ttf"
-    elif re.search(r'[\u0900-\u097F]', text): return "fonts/NotoSansDevanagari-Regular.ttf"
-    elif re.search(r'[\u0980-\u09FF]', text): return "fonts/NotoSansBengali-Regular.ttf"
-    elif re.search(r'[\u0A00-\u0A7F]', text): return "fonts/NotoSansGurmukhi-Regular.ttf"
-    elif re.search(r'[\u0A80-\u0AFF]', text): return "fonts/NotoSansGujarati-Regular.ttf"
-    elif re.search(r'[\u0B00-\u0B7F]', text): return "fonts/NotoSansOriya-Regular.ttf"
-    elif re.search(r'[\u0B80-\u0BFF]', text): return "fonts/NotoSansTamil-Regular.ttf"
-    elif re.search(r'[\u0C00-\u0C7F]', text): return "fonts/NotoSansTelugu-Regular.ttf"
-    elif re.search(r'[\u0C80-\u0CFF]', text): return "fonts/NotoSansKannada-Regular.ttf"
-    elif re.search(r'[\u0D00-\u0D7F]', text): return "fonts/NotoSansMalayalam-Regular.ttf"
-    elif re.search(r'[\u0E00-\u0E7F]', text): return "fonts/NotoSansThai-Regular.ttf"
-    elif re.search(r'[\u0E80-\u0EFF]', text): return "fonts/NotoSansLao-Regular.ttf"
-    elif re.search(r'[\u1780-\u17FF]', text): return "fonts/NotoSansKhmer-Regular.ttf"
-    elif re.search(r'[\u1000-\u109F]', text): return "fonts/NotoSansMyanmar-Regular.ttf"
-    elif re.search(r'[\u1200-\u137F]', text): return "fonts/NotoSansEthiopic-Regular.ttf"
-    elif re.search(r'[\u0530-\u058F]', text): return "fonts/NotoSansArmenian-Regular.ttf"
-    elif re.search(r'[\u10A0-\u10FF]', text): return "fonts/NotoSansGeorgian-Regular.ttf"
-    else: return "fonts/NotoSans-Regular.ttf"
+# OpenCV and Pillow are imported inside the functions that draw or decode frames,
+# so importing this module (and the login pages) stays fast
 
-# Translation
+# ffmpeg
+
+def ffmpeg_error(cmd, returncode, stderr, tail_lines=20):
+    # Keep the end of stderr, where ffmpeg explains what went wrong, in the trace log and the exception
+    tail = "\n".join(stderr.strip().splitlines()[-tail_lines:])
+    telemetry.count("ffmpeg_failures_total", tool=os.path.basename(cmd[0]))
+    telemetry.event("ffmpeg_failed", command=" ".join(cmd), returncode=returncode, stderr=tail)
+    return subprocess.CalledProcessError(returncode, cmd, stderr=tail)
+
+def run_ffmpeg(cmd):
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise ffmpeg_error(cmd, result.returncode, result.stderr.decode("utf-8", "replace"))
+    return result
+
+# Media probing
 
-def translate_segment_parallel(segment, target_lang):
+AUDIO_SAMPLE_RATE = 16000
+
+def parse_frame_rate(rate):
+    try:
+        num, _, den = (rate or "0/1").partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def probe_media(path):
+    # Reads duration and stream info from the container metadata without decoding anything
+    info = {"duration": 0.0, "has_video": False, "has_audio": False, "width": 0, "height": 0, "fps": 0.0, "frame_count": 0}
     try:
-        translated = GoogleTranslator(source="auto", target=target_lang).translate(segment["text"])
-    except Exception:
-        translated = "[Translation Failed]"
-    return {"start": segment["start"], "end": segment["end"], "text": translated}
+        result = subprocess.run([
+            "ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", path
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        data = json.loads(result.stdout)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        data = None
+
+    if data is None:
+        # No ffprobe available: OpenCV can still read the video header
+        import cv2
+        cap = cv2.VideoCapture(path)
+        if cap.isOpened():
+            info["fps"] = cap.get(cv2.CAP_PROP_FPS)
+            info["width"] = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            info["height"] = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            info["frame_count"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            info["has_video"] = info["width"] > 0
+            if info["fps"]:
+                info["duration"] = info["frame_count"] / info["fps"]
+        cap.release()
+        return info
 
-def translate_segments(segments, target_lang):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [executor.submit(translate_segment_parallel, seg, target_lang) for seg in segments]
-        results = [f.result() for f in concurrent.futures.as_completed(futures)]
-    return sorted(results, key=lambda x: x['start'])
+    info["duration"] = float(data.get("format", {}).get("duration") or 0)
+    for stream in data.get("streams", []):
+        if stream.get("codec_type") == "video" and not info["has_video"]:
+            info["has_video"] = True
+            info["width"] = int(stream.get("width") or 0)
+            info["height"] = int(stream.get("height") or 0)
+            info["fps"] = parse_frame_rate(stream.get("avg_frame_rate")) or parse_frame_rate(stream.get("r_frame_rate"))
+            info["frame_count"] = int(stream.get("nb_frames") or 0) or int(info["duration"] * info["fps"])
+        elif stream.get("codec_type") == "audio":
+            info["has_audio"] = True
+    return info
+
+def decode_audio(path, sample_rate=AUDIO_SAMPLE_RATE):
+    # Same 16 kHz mono PCM Whisper expects; decode once and hand the array to transcribe
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"
+    ]
+    result = run_ffmpeg(cmd)
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+# Translation
+
+def translate_segments(segments, target_lang, backend=None):
+    # Batched, concurrent translation that keeps segment order
+    return translation.translate_segments(segments, target_lang, backend=backend)
 
 # SRT export
 def export_srt(segments, srt_path):
@@ -73,77 +113,535 @@ def export_srt(segments, srt_path):
     with open(srt_path, "w", encoding="utf-8") as f:
         f.write(srt.compose(subs))
 
-# Subtitle rendering
+class SrtWriter:
+    # Appends subtitles to an SRT file as they are produced, keeping indices continuous
+    def __init__(self, srt_path):
+        self.file = open(srt_path, "w", encoding="utf-8")
+        self.index = 0
 
-def render_subtitles_on_video(video_path, segments, output_path, font_path, progress_callback=None):
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    temp_no_audio = tempfile.mktemp(suffix=".mp4")
-    out = cv2.VideoWriter(temp_no_audio, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    def append(self, segments):
+        for seg in segments:
+            if seg["text"].strip():
+                self.index += 1
+                self.file.write(srt.Subtitle(index=self.index,
+                                             start=timedelta(seconds=seg["start"]),
+                                             end=timedelta(seconds=seg["end"]),
+                                             content=seg["text"].strip()).to_srt())
+        self.file.flush()
 
-    font_size = max(24, width // 40)
-    font = ImageFont.truetype(font_path, font_size)
-    padding = 30
-    frame_idx = 0
-    segment_index = 0
-    current_sub = ""
+    def close(self):
+        self.file.close()
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        current_time = frame_idx / fps
-        frame_idx += 1
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# WebVTT / ASS export
+
+def format_timestamp(seconds, sep=".", ms_digits=3):
+    total_ms = int(round(seconds * 1000))
+    hours, rem = divmod(total_ms, 3600000)
+    minutes, rem = divmod(rem, 60000)
+    secs, ms = divmod(rem, 1000)
+    if ms_digits == 2:
+        return f"{hours}:{minutes:02d}:{secs:02d}{sep}{ms // 10:02d}"
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{sep}{ms:03d}"
+
+def export_webvtt(segments, vtt_path):
+    lines = ["WEBVTT", ""]
+    for seg in segments:
+        text = seg["text"].strip()
+        if text:
+            lines.append(f"{format_timestamp(seg['start'])} --> {format_timestamp(seg['end'])}")
+            lines.append(text.replace("-->", "->"))
+            lines.append("")
+    with open(vtt_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
 
-        while segment_index < len(segments):
-            seg = segments[segment_index]
+def export_ass(segments, ass_path, font_path, width=384, height=288):
+    # Script resolution matches the video, so style sizes are plain pixels
+    style = get_ass_style(font_path, width, height, face_index=get_face_for_segments(segments, font_path))
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, "
+        "ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{style['FontName']},{style['FontSize']},{style['PrimaryColour']},&H000000FF,{style['OutlineColour']},&H00000000,"
+        f"0,0,0,0,100,100,0,0,{style['BorderStyle']},{style['Outline']},{style['Shadow']},2,10,10,{style['MarginV']},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for seg in segments:
+        text = seg["text"].strip()
+        if text:
+            text = text.replace("{", "\\{").replace("}", "\\}").replace("\n", "\\N")
+            lines.append(f"Dialogue: 0,{format_timestamp(seg['start'], ms_digits=2)},{format_timestamp(seg['end'], ms_digits=2)},Default,,0,0,0,,{text}")
+    with open(ass_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def export_sidecars(segments, base_path, font_path, formats=("vtt", "ass"), width=384, height=288):
+    paths = {}
+    for fmt in formats:
+        path = f"{base_path}.{fmt}"
+        if fmt == "vtt":
+            export_webvtt(segments, path)
+        elif fmt == "ass":
+            export_ass(segments, path, font_path, width, height)
+        else:
+            continue
+        paths[fmt] = path
+    return paths
+
+# Subtitle sprites
+
+def build_subtitle_sprite(text, font_path, font_size, width, height, padding=30):
+    # Each line is drawn run by run, so mixed-script text gets the right font for every word;
+    # font_path is only used for scripts without a font of their own
+    from PIL import ImageDraw, Image
+    max_chars_per_line = max(20, width // (font_size // 2))
+    wrapped_lines = textwrap.wrap(text, width=max_chars_per_line)
+    wrapped_lines = wrapped_lines[:2]  # Limit to 2 lines
+    if not wrapped_lines:
+        return None
+
+    line_height = font_size + 8
+    outline = 2
+    top = height - padding - line_height * len(wrapped_lines) - outline
+    sprite = Image.new("RGBA", (width, line_height * len(wrapped_lines) + 2 * outline), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+
+    y = outline
+    for line in wrapped_lines:
+        runs = fonts_for_runs(split_runs(line), font_size, font_path)
+        widths = [font.getlength(run) for font, run in runs]
+        x = (width - sum(widths)) // 2
+
+        for (font, run), run_width in zip(runs, widths):
+            for dx in [-outline, outline]:
+                for dy in [-outline, outline]:
+                    draw.text((x + dx, y + dy), run, font=font, fill=(0, 0, 0, 255))
+            draw.text((x, y), run, font=font, fill=(255, 255, 255, 255))
+            x += run_width
+        y += line_height
+
+    bbox = sprite.getbbox()
+    if bbox is None:
+        return None
+    left, upper, right, lower = bbox
+    rgba = np.asarray(sprite.crop(bbox), dtype=np.float32)
+    top += upper
+
+    # Clip the sprite to the frame so short videos don't index out of bounds
+    if top < 0:
+        rgba = rgba[-top:]
+        top = 0
+    rgba = rgba[:max(0, height - top)]
+    if rgba.size == 0:
+        return None
+
+    alpha = rgba[..., 3:4] / 255.0
+    premultiplied = rgba[..., 2::-1] * alpha  # RGB -> BGR, premultiplied by alpha
+    return {"x": left, "y": top, "color": premultiplied, "inv_alpha": 1.0 - alpha}
+
+def blend_subtitle_sprite(frame, sprite):
+    h, w = sprite["color"].shape[:2]
+    roi = frame[sprite["y"]:sprite["y"] + h, sprite["x"]:sprite["x"] + w]
+    blended = roi * sprite["inv_alpha"] + sprite["color"]
+    np.clip(blended + 0.5, 0, 255, out=blended)
+    roi[:] = blended.astype(np.uint8)
+    return frame
+
+# Subtitle rendering
+
+# A track is one subtitled output of a video: {"segments", "font_path", "output_path", "srt_path"}.
+# Several tracks share one decode of the source, so N languages cost one decode plus N encodes.
+
+class SubtitleTrack:
+    def __init__(self, segments, font_path, width, height):
+        self.segments = segments
+        self.font_path = font_path
+        self.width = width
+        self.height = height
+        self.font_size = max(24, width // 40)
+        self.segment_index = 0
+        # Each subtitle is wrapped and rasterized once, then blended onto every frame it covers
+        self.sprite_text = None
+        self.sprite = None
+
+    def sprite_at(self, current_time):
+        current_sub = ""
+        while self.segment_index < len(self.segments):
+            seg = self.segments[self.segment_index]
             if seg["start"] <= current_time <= seg["end"]:
                 current_sub = seg["text"]
                 break
             elif current_time > seg["end"]:
-                segment_index += 1
-                current_sub = ""
+                self.segment_index += 1
             else:
                 break
 
-        if current_sub:
-            frame_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            draw = ImageDraw.Draw(frame_pil)
+        if not current_sub:
+            return None
+        if current_sub != self.sprite_text:
+            self.sprite_text = current_sub
+            self.sprite = build_subtitle_sprite(current_sub, self.font_path, self.font_size, self.width, self.height)
+        return self.sprite
 
-            max_chars_per_line = max(20, width // (font_size // 2))
-            wrapped_lines = textwrap.wrap(current_sub, width=max_chars_per_line)
-            wrapped_lines = wrapped_lines[:2]  # Limit to 2 lines
+def overlay_tracks(cap, outputs, fps, start_frame=0, end_frame=None, on_frame=None):
+    # outputs: [(writer, SubtitleTrack), ...] fed from a single read loop
+    frame_idx = start_frame
+    last = len(outputs) - 1
 
-            line_height = font_size + 8
-            y = height - padding - line_height * len(wrapped_lines)
+    while cap.isOpened() and (end_frame is None or frame_idx < end_frame):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        current_time = frame_idx / fps
+        frame_idx += 1
+
+        for i, (out, track) in enumerate(outputs):
+            sprite = track.sprite_at(current_time)
+            if sprite is None:
+                out.write(frame)
+            else:
+                # Writers copy the frame, so only the last track may draw on the decoded buffer itself
+                out.write(blend_subtitle_sprite(frame if i == last else frame.copy(), sprite))
 
-            for line in wrapped_lines:
-                text_width = draw.textlength(line, font=font)
-                x = (width - text_width) // 2
+        if on_frame:
+            on_frame(frame_idx - start_frame)
 
-                for dx in [-2, 2]:
-                    for dy in [-2, 2]:
-                        draw.text((x + dx, y + dy), line, font=font, fill=(0, 0, 0))
-                draw.text((x, y), line, font=font, fill=(255, 255, 255))
-                y += line_height
+    return frame_idx - start_frame
 
-            frame = cv2.cvtColor(np.array(frame_pil), cv2.COLOR_RGB2BGR)
-        out.write(frame)
+def overlay_subtitles(cap, out, segments, font_path, fps, width, height, start_frame=0, end_frame=None, on_frame=None):
+    return overlay_tracks(cap, [(out, SubtitleTrack(segments, font_path, width, height))], fps,
+                          start_frame=start_frame, end_frame=end_frame, on_frame=on_frame)
 
+def render_tracks_on_video(video_path, tracks, progress_callback=None):
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    temp_paths = [tempfile.mktemp(suffix=".mp4") for _ in tracks]
+    outputs = [(cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height)),
+                SubtitleTrack(track["segments"], track["font_path"], width, height))
+               for path, track in zip(temp_paths, tracks)]
+
+    def on_frame(done):
         if progress_callback and frame_count > 0:
-            progress_callback(80 + (frame_idx / frame_count) * 15)
+            progress_callback(80 + (done / frame_count) * 15)
 
+    try:
+        try:
+            overlay_tracks(cap, outputs, fps, on_frame=on_frame)
+        finally:
+            # A cancelled job raises out of on_frame; the writers are closed either way so the temp files can go
+            cap.release()
+            for out, _ in outputs:
+                out.release()
+
+        for temp_no_audio, track in zip(temp_paths, tracks):
+            run_ffmpeg([
+                "ffmpeg", "-y", "-i", temp_no_audio, "-i", video_path,
+                "-c:v", "copy", "-map", "0:v:0", "-map", "1:a:0?", track["output_path"]
+            ])
+    finally:
+        for temp_no_audio in temp_paths:
+            if os.path.exists(temp_no_audio):
+                os.remove(temp_no_audio)
+
+    if progress_callback:
+        progress_callback(100)
+
+def render_subtitles_on_video(video_path, segments, output_path, font_path, progress_callback=None):
+    render_tracks_on_video(video_path, [{"segments": segments, "font_path": font_path, "output_path": output_path}], progress_callback)
+
+# Parallel rendering
+
+def get_keyframe_times(video_path):
+    try:
+        result = subprocess.run([
+            "ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+            "-show_entries", "frame=pts_time", "-of", "csv=p=0", video_path
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    times = []
+    for line in result.stdout.splitlines():
+        try:
+            times.append(float(line.strip().strip(",")))
+        except ValueError:
+            continue
+    return sorted(times)
+
+def plan_render_shards(frame_count, fps, num_shards, keyframe_times=None, min_shard_frames=250):
+    num_shards = max(1, min(num_shards, frame_count // min_shard_frames))
+    keyframes = sorted({round(t * fps) for t in keyframe_times or []} - {0})
+    bounds = [0]
+    for i in range(1, num_shards):
+        target = frame_count * i // num_shards
+        # Snap to the nearest keyframe so each worker seeks cleanly
+        if keyframes:
+            target = min(keyframes, key=lambda k: abs(k - target))
+        if bounds[-1] < target < frame_count:
+            bounds.append(target)
+    bounds.append(frame_count)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def render_shard(video_path, tracks, part_paths, start_frame, end_frame, progress_queue=None, shard_index=0):
+    # One decode of the shard feeds a part file per track
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    outputs = [(cv2.VideoWriter(part_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height)),
+                SubtitleTrack(track["segments"], track["font_path"], width, height))
+               for part_path, track in zip(part_paths, tracks)]
+
+    def on_frame(done):
+        if progress_queue is not None and done % 25 == 0:
+            progress_queue.put((shard_index, done))
+
+    written = overlay_tracks(cap, outputs, fps, start_frame=start_frame, end_frame=end_frame, on_frame=on_frame)
+    cap.release()
+    for out, _ in outputs:
+        out.release()
+    if progress_queue is not None:
+        progress_queue.put((shard_index, written))
+    return written
+
+def render_tracks_parallel(video_path, tracks, workers=None, progress_callback=None):
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     cap.release()
-    out.release()
-    cv2.destroyAllWindows()
 
-    subprocess.run([
-        "ffmpeg", "-y", "-i", temp_no_audio, "-i", video_path,
-        "-c:v", "copy", "-map", "0:v:0", "-map", "1:a:0", output_path
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    workers = workers or os.cpu_count() or 1
+    shards = plan_render_shards(frame_count, fps, workers, get_keyframe_times(video_path)) if fps else []
+    if len(shards) <= 1:
+        render_tracks_on_video(video_path, tracks, progress_callback)
+        return
+
+    work_dir = tempfile.mkdtemp()
+    # part_paths[shard][track]
+    part_paths = [[os.path.join(work_dir, f"part_{i:04d}_{t}.mp4") for t in range(len(tracks))] for i in range(len(shards))]
+    # Spawn, not fork: this runs on a job worker thread of a process that holds OpenCV, logging and Mongo locks
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    progress_queue = manager.Queue()
+    shard_progress = [0] * len(shards)
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context) as executor:
+            try:
+                futures = []
+                for i, (start_frame, end_frame) in enumerate(shards):
+                    # Only ship the segments that overlap this shard's time range to the worker
+                    start_t, end_t = start_frame / fps, end_frame / fps
+                    shard_tracks = [{"segments": [seg for seg in track["segments"] if seg["end"] >= start_t and seg["start"] < end_t],
+                                     "font_path": track["font_path"]} for track in tracks]
+                    futures.append(executor.submit(render_shard, video_path, shard_tracks, part_paths[i],
+                                                   start_frame, end_frame, progress_queue, i))
+
+                pending = set(futures)
+                while pending:
+                    done, pending = concurrent.futures.wait(pending, timeout=0.5)
+                    while not progress_queue.empty():
+                        shard_index, frames_done = progress_queue.get()
+                        shard_progress[shard_index] = frames_done
+                    if progress_callback and frame_count > 0:
+                        progress_callback(80 + min(1.0, sum(shard_progress) / frame_count) * 15)
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # Leaving the with block would wait for every shard; drop the queued ones and kill the running ones
+                processes = list((executor._processes or {}).values())
+                executor.shutdown(wait=False, cancel_futures=True)
+                for process in processes:
+                    process.terminate()
+                    process.join()
+                raise
+
+        for t, track in enumerate(tracks):
+            list_path = os.path.join(work_dir, f"parts_{t}.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                f.writelines(f"file '{parts[t]}'\n" for parts in part_paths)
+
+            # Join the parts losslessly and mux the original audio in the same pass
+            run_ffmpeg([
+                "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-i", video_path,
+                "-c:v", "copy", "-map", "0:v:0", "-map", "1:a:0?", track["output_path"]
+            ])
+    finally:
+        manager.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if progress_callback:
+        progress_callback(100)
+
+def render_subtitles_parallel(video_path, segments, output_path, font_path, workers=None, progress_callback=None):
+    render_tracks_parallel(video_path, [{"segments": segments, "font_path": font_path, "output_path": output_path}],
+                           workers=workers, progress_callback=progress_callback)
+
+# ffmpeg/libass burn-in
+
+X264_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
+
+def escape_filter_value(value):
+    # Values sit in '...' at the filtergraph level, where a backslash is literal: a quote has to close the
+    # string, add \' (unescaped again by the option parser) and reopen it
+    return value.replace("\\", "/").replace(":", "\\:").replace("'", "\\'\\''")
+
+def get_font_line_ratio(font_path, face_index=0):
+    # libass sizes fonts by the OS/2 win ascent + descent rather than the em size PIL uses
+    try:
+        with open(font_path, "rb") as f:
+            data = f.read()
+        # A .ttc starts with a header listing where each face's table directory begins
+        base = struct.unpack(">I", data[12 + 4 * face_index:16 + 4 * face_index])[0] if data[:4] == b"ttcf" else 0
+        tables = {}
+        for i in range(struct.unpack(">H", data[base + 4:base + 6])[0]):
+            tag, _, offset, _ = struct.unpack(">4sIII", data[base + 12 + 16 * i:base + 28 + 16 * i])
+            tables[tag] = offset
+        units_per_em = struct.unpack(">H", data[tables[b"head"] + 18:tables[b"head"] + 20])[0]
+        win_ascent, win_descent = struct.unpack(">HH", data[tables[b"OS/2"] + 74:tables[b"OS/2"] + 78])
+        return (win_ascent + win_descent) / units_per_em
+    except (OSError, KeyError, struct.error):
+        return 1.0
+
+def get_ass_style(font_path, width, height, scale=1.0, face_index=0):
+    font_size = max(24, width // 40)
+    font = load_font(font_path, font_size, face_index)
+    return {
+        "FontName": font.getname()[0],
+        "FontSize": f"{font_size * get_font_line_ratio(font_path, face_index) * scale:.2f}",
+        "PrimaryColour": "&H00FFFFFF",
+        "OutlineColour": "&H00000000",
+        "BorderStyle": 1,
+        "Outline": max(1, round(2 * scale)),
+        "Shadow": 0,
+        "MarginV": int(30 * scale),
+    }
+
+def build_subtitles_filter(srt_path, font_path, width, height, face_index=0):
+    # libass scales SRT styles against a 288px-high script, so convert our pixel sizes to that space
+    scale = 288 / height if height else 1
+    style = ",".join(f"{key}={value}" for key, value in get_ass_style(font_path, width, height, scale, face_index).items())
+    fonts_dir = os.path.dirname(os.path.abspath(font_path))
+    return (f"subtitles=filename='{escape_filter_value(os.path.abspath(srt_path))}'"
+            f":fontsdir='{escape_filter_value(fonts_dir)}'"
+            f":force_style='{style}'")
+
+def track_filter(track, width, height):
+    # A track's segments decide which face of a .ttc collection libass is asked for
+    face = get_face_for_segments(track["segments"], track["font_path"]) if track.get("segments") else 0
+    return build_subtitles_filter(track["srt_path"], track["font_path"], width, height, face)
+
+def render_tracks_with_ffmpeg(video_path, tracks, preset="veryfast", crf=23, progress_callback=None):
+    # One decode is split into a libass chain and an x264 encoder per track, all in a single ffmpeg process
+    info = probe_media(video_path)
+    width, height, duration = info["width"], info["height"], info["duration"]
+
+    cmd = ["ffmpeg", "-y", "-nostats", "-progress", "pipe:1", "-i", video_path]
+    if len(tracks) == 1:
+        cmd += ["-vf", track_filter(tracks[0], width, height)]
+        video_maps = ["0:v:0"]
+    else:
+        labels = [f"v{i}" for i in range(len(tracks))]
+        graph = [f"[0:v:0]split={len(tracks)}" + "".join(f"[{label}]" for label in labels)]
+        graph += [f"[{label}]{track_filter(track, width, height)}[{label}out]"
+                  for label, track in zip(labels, tracks)]
+        cmd += ["-filter_complex", ";".join(graph)]
+        video_maps = [f"[{label}out]" for label in labels]
+    for video_map, track in zip(video_maps, tracks):
+        cmd += [
+            "-map", video_map, "-map", "0:a:0?",
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+            "-c:a", "copy", "-movflags", "+faststart", track["output_path"]
+        ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    # Drain stderr on a thread so a chatty ffmpeg can't block on a full pipe
+    stderr_lines = []
+    stderr_reader = threading.Thread(target=lambda: stderr_lines.extend(proc.stderr), daemon=True)
+    stderr_reader.start()
+
+    try:
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if key in ("out_time_us", "out_time_ms") and progress_callback and duration > 0 and value.isdigit():
+                progress_callback(80 + min(1.0, int(value) / 1e6 / duration) * 15)
+    except BaseException:
+        # A cancelled job raises out of progress_callback; don't leave the encoder running behind it
+        proc.kill()
+        proc.wait()
+        raise
+
+    proc.wait()
+    stderr_reader.join()
+    if proc.returncode != 0:
+        raise ffmpeg_error(cmd, proc.returncode, "".join(stderr_lines))
+
+    if progress_callback:
+        progress_callback(100)
+
+def render_subtitles_with_ffmpeg(video_path, srt_path, output_path, font_path, preset="veryfast", crf=23, progress_callback=None):
+    render_tracks_with_ffmpeg(video_path, [{"srt_path": srt_path, "font_path": font_path, "output_path": output_path}],
+                              preset=preset, crf=crf, progress_callback=progress_callback)
+
+def burn_tracks(video_path, tracks, engine="ffmpeg", preset="veryfast", workers=None, progress_callback=None):
+    # The single-pass ffmpeg engine reads the SRTs written by export_srt; OpenCV stays as the fallback
+    if engine == "ffmpeg":
+        try:
+            render_tracks_with_ffmpeg(video_path, tracks, preset=preset, progress_callback=progress_callback)
+            return "ffmpeg"
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"ffmpeg burn-in failed, falling back to OpenCV: {e}")
+    elif engine == "parallel":
+        render_tracks_parallel(video_path, tracks, workers=workers, progress_callback=progress_callback)
+        return "parallel"
+    render_tracks_on_video(video_path, tracks, progress_callback)
+    return "opencv"
+
+def burn_subtitles(video_path, segments, srt_path, output_path, font_path, engine="ffmpeg", preset="veryfast", workers=None, progress_callback=None):
+    track = {"segments": segments, "srt_path": srt_path, "output_path": output_path, "font_path": font_path}
+    return burn_tracks(video_path, [track], engine=engine, preset=preset, workers=workers, progress_callback=progress_callback)
+
+# Soft subtitles
+
+SOFT_SUBTITLE_CODECS = {".mp4": "mov_text", ".m4v": "mov_text", ".mov": "mov_text", ".mkv": "ass", ".webm": "webvtt"}
+
+def mux_soft_subtitles(video_path, subtitle_path, output_path, title=None, progress_callback=None):
+    mux_soft_subtitle_tracks(video_path, [{"srt_path": subtitle_path, "title": title}], output_path, progress_callback)
+
+def mux_soft_subtitle_tracks(video_path, tracks, output_path, progress_callback=None):
+    # Stream-copy video and audio and add one selectable subtitle track per language; nothing is re-encoded
+    codec = SOFT_SUBTITLE_CODECS.get(os.path.splitext(output_path)[1].lower(), "mov_text")
+    cmd = ["ffmpeg", "-y", "-i", video_path]
+    for track in tracks:
+        cmd += ["-i", track["srt_path"]]
+    cmd += ["-map", "0:v:0?", "-map", "0:a:0?"]
+    for i in range(len(tracks)):
+        cmd += ["-map", f"{i + 1}:0"]
+    cmd += ["-c:v", "copy", "-c:a", "copy", "-c:s", codec, "-disposition:s:0", "default"]
+    for i, track in enumerate(tracks):
+        if track.get("title"):
+            cmd += [f"-metadata:s:s:{i}", f"title={track['title']}"]
+    cmd.append(output_path)
+    run_ffmpeg(cmd)
 
     if progress_callback:
         progress_callback(100)
@@ -0,0 +1,232 @@
+import os                      # For log locations and settings
+import time                    # For span timings
+import json                    # Spans are written as JSON lines
+import uuid                    # For span ids
+import pstats                  # For summarizing job profiles
+import cProfile                # Optional per-job profiling
+import threading               # Metrics are updated from job workers and translation pools
+import contextvars             # Carries the current trace through a job
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH", os.path.join("output", "traces.jsonl"))
+TRACE_LOG_MAX_BYTES = int(os.environ.get("TRACE_LOG_MAX_BYTES", 50 * 1024 ** 2))
+PROFILE_DIR = os.path.join("output", "profiles")
+PROFILE_JOBS = os.environ.get("PROFILE_JOBS", "") == "1"
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+def parse_budgets(spec):
+    # "render=120,transcribe=600" -> {"render": 120.0, "transcribe": 600.0}
+    budgets = {}
+    for item in spec.split(","):
+        name, _, seconds = item.strip().partition("=")
+        if name and seconds:
+            budgets[name] = float(seconds)
+    return budgets
+
+# Seconds per stage; spans over budget are flagged in the log and counted
+STAGE_BUDGETS = parse_budgets(os.environ.get("STAGE_BUDGETS", ""))
+
+# Metrics
+
+class Metrics:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.setdefault(key, {"count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets)})
+            hist["count"] += 1
+            hist["sum"] += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+
+    def value(self, name, **labels):
+        with self.lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(hist, buckets=list(hist["buckets"]))) for key, hist in self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), hist in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, count in zip(self.buckets, hist["buckets"]):
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {hist['sum']:.6f}")
+            lines.append(f"{name}_count{format_labels(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+metrics = Metrics()
+
+def count(name, value=1, **labels):
+    metrics.incr(name, value, **labels)
+
+# Structured log
+
+_log_lock = threading.Lock()
+
+def write_record(record, path=None):
+    path = path or TRACE_LOG_PATH
+    line = json.dumps(record, default=str)
+    with _log_lock:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > TRACE_LOG_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"Could not write trace record: {e}")
+
+def event(name, **fields):
+    # One-off records such as ffmpeg failures, tied to the current trace
+    current = _current_trace.get()
+    write_record({"type": "event", "name": name, "trace_id": current["trace_id"] if current else None,
+                  "time": time.time(), **fields})
+
+# Tracing
+
+class Cancelled(Exception):
+    # Work stopped on purpose (e.g. job_queue.JobCancelled); spans record it as cancelled rather than as an error
+    pass
+
+_span_listeners = []
+
+def add_span_listener(listener):
+    # Listeners get every finished span record, e.g. to learn stage throughput
+    if listener not in _span_listeners:
+        _span_listeners.append(listener)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+@contextmanager
+def trace(trace_id=None, **attrs):
+    # Groups the spans of one job; every span records its trace id so the log can be filtered by job
+    current = {"trace_id": trace_id or uuid.uuid4().hex, "spans": [], **attrs}
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+@contextmanager
+def span(name, **attrs):
+    # attrs is yielded so callers can add counts as they learn them: s["frames"] = n
+    current = _current_trace.get()
+    parent = _current_span.get()
+    record = {"type": "span", "name": name, "span_id": uuid.uuid4().hex[:16],
+              "parent_id": parent["span_id"] if parent else None,
+              "trace_id": current["trace_id"] if current else None, "start": time.time()}
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = "cancelled" if isinstance(e, Cancelled) else "error"
+        attrs.setdefault("error", str(e) or e.__class__.__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        duration = time.perf_counter() - started
+        record.update(attrs)
+        record.update(duration=round(duration, 6), status=status)
+
+        metrics.observe("stage_duration_seconds", duration, stage=name)
+        metrics.incr("stage_runs_total", stage=name, status=status)
+        for key in ("frames", "bytes", "segments"):
+            if isinstance(attrs.get(key), (int, float)):
+                metrics.incr(f"stage_{key}_total", attrs[key], stage=name)
+        budget = STAGE_BUDGETS.get(name)
+        if budget is not None and duration > budget:
+            record["over_budget"] = budget
+            metrics.incr("stage_budget_exceeded_total", stage=name)
+
+        if current is not None:
+            current["spans"].append(record)
+        write_record(record)
+        for listener in _span_listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                print(f"Span listener failed: {e}")
+
+# Profiling
+
+@contextmanager
+def profile(name, enabled=None, top=25):
+    # cProfile only sees the calling thread; work on translation or render pools shows up as waits
+    if not (PROFILE_JOBS if enabled is None else enabled):
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.prof")
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler).sort_stats("cumulative")
+        hot = [{"function": f"{func[0]}:{func[1]}({func[2]})", "calls": cc, "cumulative": round(ct, 4)}
+               for func, (cc, nc, tt, ct, callers) in list(stats.stats.items())]
+        hot = sorted(hot, key=lambda item: item["cumulative"], reverse=True)[:top]
+        event("profile", path=path, hot=hot)
+
+# Prometheus endpoint
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port=None):
+    # Streamlit cannot serve extra routes, so /metrics gets its own small server when METRICS_PORT is set
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
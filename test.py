@@ -1 +1,613 @@
+import os                      # For scratch paths
+import shutil                  # For finding ffmpeg
+import tempfile                # Scratch directories for file-based tests
+import subprocess              # For running ffmpeg against generated filters
+import importlib.util          # For skipping tests whose optional stand-ins are missing
+import unittest                # python -m unittest test
 
+
+HAS_MONGOMOCK = importlib.util.find_spec("mongomock") is not None
+
+def use_mongomock():
+    import mongomock
+    import db_setup
+    db_setup.set_client(mongomock.MongoClient())
+    db_setup.create_tables()
+    return db_setup
+
+
+# ffmpeg filters
+
+class FilterEscapingTest(unittest.TestCase):
+    def test_quotes_and_colons(self):
+        from subtitle_generator import escape_filter_value
+        self.assertEqual(escape_filter_value("C:\\it's"), "C\\:/it\\'\\''s")
+
+    @unittest.skipUnless(shutil.which("ffmpeg"), "ffmpeg not installed")
+    def test_subtitles_filter_accepts_awkward_paths(self):
+        from subtitle_generator import build_subtitles_filter, export_srt, get_font_for_text
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = os.path.join(tmp, "it's a:dir")
+            os.makedirs(folder)
+            srt_path = os.path.join(folder, "talk's.srt")
+            export_srt([{"start": 0.0, "end": 0.5, "text": "hello"}], srt_path)
+            result = subprocess.run([
+                "ffmpeg", "-v", "error", "-f", "lavfi", "-i", "color=size=320x240:duration=1",
+                "-vf", build_subtitles_filter(srt_path, get_font_for_text("hello"), 320, 240), "-f", "null", "-"
+            ], capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+
+# Fonts
+
+class ScriptRunsTest(unittest.TestCase):
+    def test_runs_split_where_the_script_changes(self):
+        from font_selection import split_runs
+        self.assertEqual(split_runs("Hello שלום!"), [("latin", "Hello "), ("hebrew", "שלום!")])
+        self.assertEqual(split_runs("नमस्ते world"), [("devanagari", "नमस्ते "), ("latin", "world")])
+
+    def test_shared_characters(self):
+        from font_selection import split_runs
+        self.assertEqual(split_runs(""), [])
+        self.assertEqual(split_runs("123 ..."), [("latin", "123 ...")])
+        # Leading punctuation joins the first run instead of getting one of its own
+        self.assertEqual(split_runs("« مرحبا"), [("arabic", "« مرحبا")])
+
+    def test_han_follows_kana_and_hangul(self):
+        from font_selection import split_runs
+        self.assertEqual(split_runs("日本語のテキスト"), [("japanese", "日本語のテキスト")])
+        self.assertEqual(split_runs("한국어 漢字"), [("korean", "한국어 漢字")])
+        self.assertEqual(split_runs("你好"), [("han", "你好")])
+
+# Sidecar formats
+
+class SidecarTest(unittest.TestCase):
+    def test_format_timestamp(self):
+        from subtitle_generator import format_timestamp
+        self.assertEqual(format_timestamp(3723.456), "01:02:03.456")
+        # ASS: unpadded hours and centiseconds
+        self.assertEqual(format_timestamp(3723.456, ms_digits=2), "1:02:03.45")
+        self.assertEqual(format_timestamp(59.9996), "00:01:00.000")
+
+    def test_webvtt(self):
+        from subtitle_generator import export_webvtt
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "a.vtt")
+            export_webvtt([{"start": 0.0, "end": 1.5, "text": " a --> b "}, {"start": 2.0, "end": 3.0, "text": "  "}], path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "WEBVTT\n\n00:00:00.000 --> 00:00:01.500\na -> b\n")
+
+    def test_ass_events(self):
+        from subtitle_generator import export_ass, get_font_for_text
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "a.ass")
+            export_ass([{"start": 1.0, "end": 2.25, "text": "{\\b1}bold\nnext"}], path, get_font_for_text("a"))
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        self.assertIn("PlayResY: 288", lines)
+        self.assertTrue(any(line.startswith("Style: Default,Noto Sans,") for line in lines))
+        self.assertEqual(lines[-1], "Dialogue: 0,0:00:01.00,0:00:02.25,Default,,0,0,0,,\\{\\b1\\}bold\\Nnext")
+
+# Cancellation
+
+class Cancelled(Exception):
+    pass
+
+def cancel_on_first_progress(progress):
+    raise Cancelled()
+
+class RenderCancellationTest(unittest.TestCase):
+    def test_ffmpeg_is_killed(self):
+        import sys
+        import subtitle_generator
+        from unittest import mock
+        with tempfile.TemporaryDirectory() as tmp:
+            # Stands in for an encoder that reports progress and keeps running
+            stub = os.path.join(tmp, "ffmpeg")
+            with open(stub, "w") as f:
+                f.write(f"#!{sys.executable}\nimport sys, time\nprint('out_time_us=1000000', flush=True)\ntime.sleep(60)\n")
+            os.chmod(stub, 0o755)
+            started = []
+            popen = subprocess.Popen
+
+            def record_popen(cmd, **kwargs):
+                started.append(popen([stub] + cmd[1:], **kwargs))
+                return started[-1]
+
+            with mock.patch.object(subtitle_generator, "probe_media", return_value={"width": 320, "height": 240, "duration": 10}), \
+                 mock.patch.object(subtitle_generator.subprocess, "Popen", record_popen):
+                with self.assertRaises(Cancelled):
+                    subtitle_generator.render_tracks_with_ffmpeg(
+                        "in.mp4", [{"srt_path": "a.srt", "font_path": subtitle_generator.get_font_for_text("a"), "output_path": "out.mp4"}],
+                        progress_callback=cancel_on_first_progress)
+            self.assertIsNotNone(started[0].poll())
+
+    @unittest.skipUnless(shutil.which("ffmpeg"), "ffmpeg not installed")
+    def test_opencv_render_cleans_up(self):
+        import subtitle_generator
+        from unittest import mock
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, "in.mp4")
+            subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=10:duration=1", video], check=True)
+            scratch = os.path.join(tmp, "scratch")
+            os.makedirs(scratch)
+            temp_paths = iter(os.path.join(scratch, f"{i}.mp4") for i in range(2))
+            tracks = [{"segments": [{"start": 0.0, "end": 1.0, "text": "a"}], "font_path": subtitle_generator.get_font_for_text("a"),
+                       "output_path": os.path.join(tmp, f"out{i}.mp4")} for i in range(2)]
+            with mock.patch.object(subtitle_generator.tempfile, "mktemp", lambda suffix: next(temp_paths)):
+                with self.assertRaises(Cancelled):
+                    subtitle_generator.render_tracks_on_video(video, tracks, progress_callback=cancel_on_first_progress)
+            self.assertEqual(os.listdir(scratch), [])
+
+# Fonts in collections
+
+HAS_FONTTOOLS = importlib.util.find_spec("fontTools") is not None
+
+@unittest.skipUnless(HAS_FONTTOOLS, "fontTools not installed")
+class FontCollectionTest(unittest.TestCase):
+    def test_styles_read_the_requested_face(self):
+        from fontTools.ttLib import TTFont, TTCollection
+        from subtitle_generator import get_ass_style, get_font_line_ratio
+        with tempfile.TemporaryDirectory() as tmp:
+            # Stands in for NotoSansCJK-Regular.ttc: two faces with different names and metrics
+            collection = TTCollection()
+            collection.fonts = [TTFont(os.path.join("fonts", name)) for name in ("NotoSans-Regular.ttf", "NotoSansThai-Regular.ttf")]
+            path = os.path.join(tmp, "Collection.ttc")
+            collection.save(path)
+            self.assertEqual(get_ass_style(path, 1280, 720, face_index=1)["FontName"], "Noto Sans Thai")
+            self.assertEqual(get_font_line_ratio(path, 1), get_font_line_ratio(os.path.join("fonts", "NotoSansThai-Regular.ttf")))
+            self.assertEqual(get_font_line_ratio(path, 0), get_font_line_ratio(os.path.join("fonts", "NotoSans-Regular.ttf")))
+            self.assertNotEqual(get_font_line_ratio(path, 1), 1.0)
+
+    def test_cjk_segments_pick_their_face(self):
+        from font_selection import get_face_for_segments
+        self.assertEqual(get_face_for_segments([{"text": "안녕하세요"}], "NotoSansCJK-Regular.ttc"), 1)
+        self.assertEqual(get_face_for_segments([{"text": "你好"}], "NotoSansCJK-Regular.ttc"), 2)
+        self.assertEqual(get_face_for_segments([{"text": "你好"}], "NotoSansSC-Regular.ttf"), 0)
+
+# Multi-language fan-out
+
+class FakeCapture:
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        return (True, self.frames.pop(0)) if self.frames else (False, None)
+
+class FakeWriter:
+    # Keeps a copy of every frame, the way VideoWriter encodes it on write
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame.copy())
+
+class FanOutTest(unittest.TestCase):
+    def test_each_track_gets_only_its_own_subtitle(self):
+        import numpy as np
+        from subtitle_generator import overlay_tracks, SubtitleTrack, blend_subtitle_sprite, get_font_for_text
+        font_path = get_font_for_text("a")
+        texts = ["Guten Tag", "Bonjour"]
+        source = np.full((240, 320, 3), 64, dtype=np.uint8)
+        writers = [FakeWriter() for _ in texts]
+        outputs = [(writer, SubtitleTrack([{"start": 0.0, "end": 1.0, "text": text}], font_path, 320, 240))
+                   for writer, text in zip(writers, texts)]
+        overlay_tracks(FakeCapture([source.copy(), source.copy()]), outputs, 25)
+        for writer, text in zip(writers, texts):
+            sprite = SubtitleTrack([{"start": 0.0, "end": 1.0, "text": text}], font_path, 320, 240).sprite_at(0.0)
+            expected = blend_subtitle_sprite(source.copy(), sprite)
+            self.assertEqual(len(writer.frames), 2)
+            for frame in writer.frames:
+                self.assertTrue(np.array_equal(frame, expected))
+        self.assertFalse(np.array_equal(writers[0].frames[0], writers[1].frames[0]))
+
+    def test_target_languages_are_deduplicated(self):
+        from pipeline import target_languages
+        self.assertEqual(target_languages({"target_langs": ["de", "fr", "de"], "target_names": ["German", "French", "German"]}),
+                         [("de", "German"), ("fr", "French")])
+        self.assertEqual(target_languages({"target_lang": "de", "target_name": "German"}), [("de", "German")])
+
+    def test_output_names(self):
+        from pipeline import track_output_names
+        self.assertEqual(track_output_names("talk", "de", {}, False, "burned"), {"video": "talk_subtitled.mp4", "srt": "talk.srt"})
+        self.assertEqual(track_output_names("talk", "de", {}, True, "burned"), {"video": "talk_de_subtitled.mp4", "srt": "talk.de.srt"})
+        # Soft jobs share one video between languages; the subtitle files still carry the code
+        self.assertEqual(track_output_names("talk", "fr", {"vtt": "x.vtt", "ass": "x.ass"}, True, "soft"),
+                         {"video": "talk_subtitled.mp4", "srt": "talk.fr.srt", "vtt": "talk.fr.vtt", "ass": "talk.fr.ass"})
+
+# Chunked transcription
+
+class FakeWhisper:
+    # Times one segment per window past the end of the audio, the way Whisper's 30 s padding can
+    def transcribe(self, audio, **kwargs):
+        from chunked_transcription import SAMPLE_RATE
+        end = len(audio) / SAMPLE_RATE + 5
+        return {"segments": [{"start": 0.0, "end": end, "text": " line"}], "text": "line", "language": "en"}
+
+class ChunkingTest(unittest.TestCase):
+    def test_trim_overlap(self):
+        from chunked_transcription import trim_overlap
+        segments = [{"start": 9.0, "end": 12.0, "text": "a"}, {"start": 10.0, "end": 11.0, "text": "b"},
+                    {"start": 11.5, "end": 14.0, "text": "c"}]
+        trimmed, last_end = trim_overlap(segments, 10.0)
+        self.assertEqual([(seg["start"], seg["end"], seg["text"]) for seg in trimmed], [(10.0, 12.0, "a"), (12.0, 14.0, "c")])
+        self.assertEqual(last_end, 14.0)
+
+    def test_chunks_cover_the_audio(self):
+        import numpy as np
+        from chunked_transcription import find_chunks, SAMPLE_RATE
+        audio = np.random.default_rng(0).normal(0, 0.1, SAMPLE_RATE * 100).astype(np.float32)
+        audio[SAMPLE_RATE * 28:SAMPLE_RATE * 29] = 0
+        chunks = find_chunks(audio, chunk_seconds=30, search_seconds=5)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(audio))
+        self.assertTrue(all(prev[1] == nxt[0] for prev, nxt in zip(chunks, chunks[1:])))
+        # The first cut lands in the silence rather than at exactly 30 s
+        self.assertTrue(SAMPLE_RATE * 28 <= chunks[0][1] <= SAMPLE_RATE * 29)
+
+    def test_segments_end_inside_their_window(self):
+        import numpy as np
+        from chunked_transcription import iter_transcribe, find_chunks, SAMPLE_RATE
+        audio = np.random.default_rng(0).normal(0, 0.1, SAMPLE_RATE * 100).astype(np.float32)
+        chunks = find_chunks(audio, chunk_seconds=30, search_seconds=5)
+        segments = [seg for batch, _ in iter_transcribe(FakeWhisper(), audio) for seg in batch]
+        self.assertEqual([seg["end"] for seg in segments], [end / SAMPLE_RATE for _, end in chunks])
+
+class CachedTranscriptTest(unittest.TestCase):
+    def test_cache_hit_is_streamed_in_slices(self):
+        import pipeline
+        from unittest import mock
+        from transcript_cache import TranscriptCache
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TranscriptCache(root=tmp)
+            segments = [{"start": i, "end": i + 1, "text": f"line {i}"} for i in range(120)]
+            cache.put("hash", "tiny", None, segments)
+            with mock.patch.object(pipeline, "get_transcript_cache", return_value=cache):
+                batches = list(pipeline.iter_segment_batches("unused.mp4", {"media_hash": "hash", "model_size": "tiny"}))
+        self.assertEqual([len(batch) for batch, _ in batches], [50, 50, 20])
+        self.assertEqual(batches[-1][1], 1.0)
+        self.assertEqual([seg for batch, _ in batches for seg in batch], segments)
+
+# Translation
+
+class ScriptedBackend:
+    # Backend stand-in whose batch replies are controlled by the test
+    name = "scripted"
+    max_chars = 4500
+
+    def __init__(self, merge_batches=False, fail=False):
+        self.merge_batches = merge_batches
+        self.fail = fail
+        self.calls = []
+
+    def translate_batch(self, texts, source, target):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise ConnectionError("backend down")
+        translated = [f"<{text}>" for text in texts]
+        # A reply that lost the delimiter comes back as one line
+        return [" ".join(translated)] if self.merge_batches and len(texts) > 1 else translated
+
+class TranslateBatchTest(unittest.TestCase):
+    def test_delimiter_loss_falls_back_per_segment(self):
+        from translation import translate_batch
+        backend = ScriptedBackend(merge_batches=True)
+        self.assertEqual(translate_batch(backend, ["a", "b", "c"], "auto", "de", backoff=0), ["<a>", "<b>", "<c>"])
+        self.assertEqual(backend.calls, [["a", "b", "c"], ["a"], ["b"], ["c"]])
+
+    def test_backend_errors_are_not_retried_per_segment(self):
+        from translation import translate_batch, TranslationUnavailable
+        backend = ScriptedBackend(fail=True)
+        with self.assertRaises(TranslationUnavailable):
+            translate_batch(backend, ["a", "b", "c"], "auto", "de", retries=2, backoff=0)
+        self.assertEqual(len(backend.calls), 3)
+        self.assertTrue(all(call == ["a", "b", "c"] for call in backend.calls))
+
+class TranslateTextsTest(unittest.TestCase):
+    def test_repeated_lines_are_sent_once(self):
+        from translation import translate_texts
+        backend = ScriptedBackend()
+        self.assertEqual(translate_texts(["hi", "ho", " hi ", "hi"], "de", backend=backend), ["<hi>", "<ho>", "<hi>", "<hi>"])
+        self.assertEqual(backend.calls, [["hi", "ho"]])
+
+    def test_cache_is_keyed_by_backend(self):
+        from translation import translate_texts
+        from translation_cache import TranslationCache
+        cache = TranslationCache(":memory:")
+        cache.put_many([("hi", "[de] hi")], "auto", "de", "offline")
+        backend = ScriptedBackend()
+        self.assertEqual(translate_texts(["hi"], "de", backend=backend, cache=cache), ["<hi>"])
+        self.assertEqual(cache.get_many(["hi"], "auto", "de", "scripted"), {"hi": "<hi>"})
+
+class TranslationCacheTest(unittest.TestCase):
+    def test_disk_tier_stays_within_its_limit(self):
+        from translation_cache import TranslationCache
+        cache = TranslationCache(":memory:", disk_entries=20)
+        for i in range(5):
+            cache.put_many([(f"line {i}-{j}", f"zeile {i}-{j}") for j in range(10)], "en", "de", "google")
+            self.assertLessEqual(cache.rows, 20)
+            self.assertEqual(cache.rows, cache.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0])
+        # The newest lines survive eviction
+        self.assertEqual(cache.get_many(["line 4-9"], "en", "de", "google"), {"line 4-9": "zeile 4-9"})
+        cache.invalidate(target="de")
+        self.assertEqual(cache.rows, 0)
+
+# Model registry
+
+class ModelRegistryTest(unittest.TestCase):
+    def borrow_concurrently(self, registry, borrowers=3):
+        import threading
+        import time
+        in_use = []
+        shared = []
+
+        def borrow():
+            with registry.acquire("tiny") as model:
+                shared.append(any(other is model for other in in_use))
+                in_use.append(model)
+                time.sleep(0.05)
+                in_use.remove(model)
+
+        threads = [threading.Thread(target=borrow) for _ in range(borrowers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return shared
+
+    def test_busy_model_gets_a_second_instance_when_it_fits(self):
+        from model_registry import ModelRegistry, MODEL_BYTES
+        registry = ModelRegistry(budget_bytes=MODEL_BYTES["tiny"] * 2, loader=lambda model_size, device: object())
+        self.assertEqual(self.borrow_concurrently(registry), [False, False, False])
+        self.assertEqual(registry.stats["loads"], 2)
+        self.assertGreater(registry.stats["waits"], 0)
+
+    def test_borrowers_wait_when_the_budget_is_full(self):
+        from model_registry import ModelRegistry, MODEL_BYTES
+        registry = ModelRegistry(budget_bytes=MODEL_BYTES["tiny"], loader=lambda model_size, device: object())
+        self.assertEqual(self.borrow_concurrently(registry), [False, False, False])
+        self.assertEqual(registry.stats["loads"], 1)
+
+    def test_idle_models_make_room(self):
+        from model_registry import ModelRegistry, MODEL_BYTES
+        registry = ModelRegistry(budget_bytes=MODEL_BYTES["base"], loader=lambda model_size, device: object())
+        with registry.acquire("tiny"):
+            pass
+        with registry.acquire("base"):
+            pass
+        self.assertEqual(list(registry.loaded()), [("base", "cpu")])
+        self.assertEqual(registry.stats["evictions"], 1)
+
+class FakePool:
+    def __init__(self, model_size, device, replicas):
+        self.replicas = replicas
+        self.closed = False
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.closed = True
+
+class ReplicaPoolTest(unittest.TestCase):
+    def test_pool_is_shared_and_counted(self):
+        from model_registry import ModelRegistry, MODEL_BYTES
+        registry = ModelRegistry(budget_bytes=MODEL_BYTES["tiny"] * 8)
+        with registry.acquire_pool("tiny", "cpu", 4, FakePool) as first:
+            with registry.acquire_pool("tiny", "cpu", 4, FakePool) as second:
+                self.assertIs(first, second)
+                self.assertEqual(registry.total_bytes("cpu"), MODEL_BYTES["tiny"] * 4)
+        self.assertEqual(registry.stats["loads"], 1)
+
+    def test_pool_fits_next_to_busy_models(self):
+        from model_registry import ModelRegistry, MODEL_BYTES
+        registry = ModelRegistry(budget_bytes=MODEL_BYTES["tiny"] * 3, loader=lambda model_size, device: object())
+        with registry.acquire("tiny"):
+            with registry.acquire_pool("tiny", "cpu", 4, FakePool) as pool:
+                self.assertEqual(pool.replicas, 2)
+
+    def test_idle_pool_is_shut_down_on_eviction(self):
+        from model_registry import ModelRegistry, MODEL_BYTES
+        registry = ModelRegistry(budget_bytes=MODEL_BYTES["tiny"] * 2, loader=lambda model_size, device: object())
+        with registry.acquire_pool("tiny", "cpu", 2, FakePool) as pool:
+            pass
+        with registry.acquire("tiny"):
+            self.assertTrue(pool.closed)
+        self.assertEqual(list(registry.loaded()), [("tiny", "cpu")])
+
+# Accounts and history
+
+@unittest.skipUnless(HAS_MONGOMOCK, "mongomock not installed")
+class HistoryTest(unittest.TestCase):
+    def test_push_history_keeps_the_newest_entries(self):
+        db_setup = use_mongomock()
+        pushed = [{"video_path": f"v{i}.mp4", "srt_path": f"s{i}.srt"} for i in range(db_setup.HISTORY_LIMIT + 2)]
+        dropped = []
+        for entry in pushed:
+            dropped += db_setup.push_history("alice", entry)[0]
+        self.assertEqual([entry["video_path"] for entry in dropped], ["v0.mp4", "v1.mp4"])
+        self.assertEqual([entry["video_path"] for entry in db_setup.get_history("alice")],
+                         [entry["video_path"] for entry in pushed[2:]])
+
+    def test_legacy_history_is_migrated_with_the_schema(self):
+        import mongomock
+        import db_setup
+        client = mongomock.MongoClient()
+        client[db_setup.DB_NAME]["users"].insert_one({"username": "alice", "history": [{"video_path": "old.mp4"}]})
+        db_setup.set_client(client)
+        db_setup.create_tables()
+        self.assertEqual(db_setup.get_history("alice"), [{"video_path": "old.mp4"}])
+        self.assertNotIn("history", client[db_setup.DB_NAME]["users"].find_one({"username": "alice"}))
+
+    def test_rename_to_a_taken_name_changes_nothing(self):
+        from pymongo.errors import DuplicateKeyError
+        db_setup = use_mongomock()
+        users = db_setup.get_connection()["users"]
+        users.insert_many([{"username": "alice", "password": b"a"}, {"username": "bob", "password": b"b"}])
+        db_setup.push_history("alice", {"video_path": "a.mp4"})
+        with self.assertRaises(DuplicateKeyError):
+            db_setup.rename_user("alice", "bob", b"c")
+        self.assertEqual(users.find_one({"username": "alice"})["password"], b"a")
+        self.assertEqual(len(db_setup.get_history("alice")), 1)
+
+# ETAs
+
+class EtaStoreTest(unittest.TestCase):
+    def test_transcribe_rates_stay_on_their_device(self):
+        from eta_store import ThroughputStore, DEFAULT_RATES
+        store = ThroughputStore(":memory:")
+        store.record("transcribe", "tiny:cuda", 600, 10)
+        self.assertEqual(store.transcribe_rate("transcribe", "tiny", "cpu"), DEFAULT_RATES["transcribe"]["tiny"])
+        self.assertEqual(store.transcribe_rate("transcribe", "tiny", "cuda"), 60)
+
+    def test_render_falls_back_to_other_presets_of_the_engine(self):
+        from eta_store import ThroughputStore
+        store = ThroughputStore(":memory:")
+        store.record("render", "ffmpeg:medium", 30, 1)
+        store.record("render", "opencv:none", 5, 1)
+        plan = store.plan({"render_engine": "ffmpeg", "x264_preset": "veryfast"},
+                          {"duration": 10, "fps": 30, "width": 1000, "height": 1000})
+        self.assertEqual(plan[-1]["seconds"], 10.0)
+
+# Batch resume
+
+class CheckpointTest(unittest.TestCase):
+    def test_key_follows_file_and_output_settings(self):
+        from batch import checkpoint_key
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "talk.mp4")
+            with open(path, "wb") as f:
+                f.write(b"x")
+            params = {"target_langs": ["de"], "model_size": "tiny", "streaming": True}
+            key = checkpoint_key(path, params)
+            self.assertEqual(checkpoint_key(path, dict(params, streaming=False)), key)
+            self.assertNotEqual(checkpoint_key(path, dict(params, model_size="base")), key)
+            os.utime(path, ns=(0, 10 ** 9))
+            self.assertNotEqual(checkpoint_key(path, params), key)
+
+    def test_report_covers_earlier_runs(self):
+        import json
+        from batch import load_checkpoint, report_records
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint_path = os.path.join(tmp, "checkpoint.jsonl")
+            with open(checkpoint_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"key": "a", "file": "a.mp4", "status": "done"}) + "\n")
+                f.write(json.dumps({"key": "b", "file": "b.mp4", "status": "failed"}) + "\n")
+                f.write('{"key": "c", "fi')
+                f.write("\n" + json.dumps({"key": "b", "file": "b.mp4", "status": "done"}) + "\n")
+            self.assertEqual({key: record["status"] for key, record in load_checkpoint(checkpoint_path).items()},
+                             {"a": "done", "b": "done"})
+            records = report_records([{"key": "a"}, {"key": "b"}, {"key": "new"}], checkpoint_path)
+            self.assertEqual([record["file"] for record in records], ["a.mp4", "b.mp4"])
+
+# Job queue
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        from job_queue import JobQueue
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # No worker threads: the tests claim jobs themselves
+        self.queue = JobQueue(lambda job, report: None, path=os.path.join(self.tmp.name, "jobs.sqlite"), workers=0,
+                              report_interval=0)
+
+    def test_users_take_turns(self):
+        alice = [self.queue.submit("alice", {"n": i}) for i in range(3)]
+        bob = self.queue.submit("bob", {})
+        claimed = [self.queue._claim_next()["id"] for _ in range(3)]
+        # Alice queued first, then Bob has fewer jobs running, then Alice again
+        self.assertEqual(claimed, [alice[0], bob, alice[1]])
+
+    def test_priority_within_equal_load(self):
+        low = self.queue.submit("alice", {})
+        high = self.queue.submit("bob", {}, priority=1)
+        self.assertEqual(self.queue._claim_next()["id"], high)
+        self.assertEqual(self.queue._claim_next()["id"], low)
+
+    def test_cancel_queued_and_running(self):
+        from job_queue import JobCancelled
+        running = self.queue.submit("alice", {})
+        queued = self.queue.submit("alice", {})
+        self.assertEqual(self.queue._claim_next()["id"], running)
+        report = self.queue._make_reporter(running)
+        report("transcribing", 10)
+        self.queue.cancel(queued)
+        self.queue.cancel(running)
+        self.assertEqual(self.queue.get(queued)["status"], "cancelled")
+        self.assertIsNone(self.queue._claim_next())
+        with self.assertRaises(JobCancelled):
+            report("transcribing", 20)
+
+# Telemetry
+
+class SpanStatusTest(unittest.TestCase):
+    def test_cancelled_jobs_are_not_errors(self):
+        from telemetry import span, trace
+        from job_queue import JobCancelled
+        with trace() as current:
+            for exc in (JobCancelled("job"), ValueError("boom")):
+                with self.assertRaises(type(exc)):
+                    with span("stage"):
+                        raise exc
+        self.assertEqual([record["status"] for record in current["spans"]], ["cancelled", "error"])
+
+# Artifact retention
+
+@unittest.skipUnless(HAS_MONGOMOCK, "mongomock not installed")
+class HistoryReferencesTest(unittest.TestCase):
+    def test_shared_object_survives_another_users_trim(self):
+        db_setup = use_mongomock()
+        shared = {"video_path": "output/objects/ab/shared.mp4", "srt_path": "output/objects/cd/shared.srt"}
+        db_setup.push_history("alice", shared)
+        db_setup.push_history("bob", dict(shared))
+        dropped = []
+        for i in range(db_setup.HISTORY_LIMIT):
+            dropped += db_setup.push_history("alice", {"video_path": f"v{i}.mp4", "srt_path": f"s{i}.srt"})[0]
+        self.assertEqual([entry["video_path"] for entry in dropped], [shared["video_path"]])
+        self.assertEqual(db_setup.referenced_paths(dropped), {shared["video_path"], shared["srt_path"]})
+
+    def test_unreferenced_paths_are_released(self):
+        db_setup = use_mongomock()
+        db_setup.push_history("alice", {"video_path": "a.mp4", "srt_path": "a.srt", "sidecar_paths": {"vtt": "a.vtt"}})
+        dropped = []
+        for i in range(db_setup.HISTORY_LIMIT):
+            dropped += db_setup.push_history("alice", {"video_path": f"v{i}.mp4", "srt_path": f"s{i}.srt"})[0]
+        self.assertEqual(db_setup.referenced_paths(dropped), set())
+
+class QuotaTest(unittest.TestCase):
+    def test_kept_objects_are_not_evicted(self):
+        from artifact_store import enforce_quota
+        with tempfile.TemporaryDirectory() as root:
+            paths = []
+            for name in ("upload.mp4", "old.mp4"):
+                path = os.path.join(root, "objects", name[:2], name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(b"x" * 100)
+                paths.append(path)
+            evicted = enforce_quota(max_bytes=0, root=root, keep=[paths[0]])
+            self.assertEqual(evicted, [paths[1]])
+            self.assertTrue(os.path.exists(paths[0]))
+
+    def test_kept_objects_count_toward_the_quota(self):
+        from artifact_store import enforce_quota
+        with tempfile.TemporaryDirectory() as root:
+            paths = []
+            for name in ("old.mp4", "upload.mp4"):
+                path = os.path.join(root, "objects", name[:2], name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(b"x" * 100)
+                paths.append(path)
+            # Only the upload fits; the older object has to go even though it alone is under the limit
+            self.assertEqual(enforce_quota(max_bytes=150, root=root, keep=[paths[1]]), [paths[0]])
+
+    def test_active_upload_paths(self):
+        from job_queue import JobQueue, active_upload_paths
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_path = os.path.join(tmp, "jobs.sqlite")
+            queue = JobQueue(lambda job, report: None, path=queue_path, workers=0)
+            queue.submit("alice", {"upload_path": "output/objects/ab/upload.mp4"})
+            self.assertEqual(active_upload_paths(queue_path), ["output/objects/ab/upload.mp4"])
+
+if __name__ == "__main__":
+    unittest.main()
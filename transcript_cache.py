@@ -0,0 +1,84 @@
+import os                      # For cache file locations
+import gzip                    # Transcripts are stored compressed
+import json                    # Segment serialization
+import hashlib                 # For cache keys
+import threading               # Cache is shared by the job workers
+from artifact_store import ARTIFACT_ROOT
+
+
+CACHE_ROOT = os.environ.get("TRANSCRIPT_CACHE_DIR", os.path.join(ARTIFACT_ROOT, "transcripts"))
+MAX_CACHE_BYTES = int(os.environ.get("TRANSCRIPT_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+
+class TranscriptCache:
+    def __init__(self, root=CACHE_ROOT, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def path_for(self, media_hash, model_size, language):
+        key = hashlib.sha256(f"{media_hash}:{model_size}:{language or 'auto'}".encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key[:2], key + ".json.gz")
+
+    def get(self, media_hash, model_size, language):
+        path = self.path_for(media_hash, model_size, language)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                segments = json.load(f)["segments"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        with self.lock:
+            self.stats["hits"] += 1
+        return segments
+
+    def put(self, media_hash, model_size, language, segments):
+        path = self.path_for(media_hash, model_size, language)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {"segments": [{"start": seg["start"], "end": seg["end"], "text": seg["text"]} for seg in segments]}
+        # Write then rename so a concurrent reader never sees a partial file; batch workers are separate
+        # processes whose thread ids can repeat, so the temp name needs the pid too
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.stats["writes"] += 1
+            self._evict()
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def _evict(self):
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats["evictions"] += 1
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_transcript_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TranscriptCache()
+        return _default_cache
@@ -0,0 +1,209 @@
+import os                      # For reading the backend selection from the environment
+import time                    # For retry backoff and simulated latency
+import random                  # For jittering retry delays
+import collections             # For keeping streamed batches in order
+import concurrent.futures      # For running translation batches concurrently
+from telemetry import count
+
+
+FAILED_TRANSLATION = "[Translation Failed]"
+BATCH_DELIMITER = "\n"
+# Per-segment fallback calls in a row that may fail before the backend is treated as down
+MAX_CONSECUTIVE_FAILURES = 3
+# Languages translated side by side when one transcript fans out to several targets
+TARGET_WORKERS = int(os.environ.get("TRANSLATION_TARGET_WORKERS", 3))
+
+class TranslationUnavailable(Exception):
+    pass
+
+# Backends
+
+class GoogleBackend:
+    name = "google"
+    max_chars = 4500  # Google rejects requests over 5000 characters
+
+    def translate_batch(self, texts, source, target):
+        from deep_translator import GoogleTranslator
+        translated = GoogleTranslator(source=source, target=target).translate(BATCH_DELIMITER.join(texts))
+        return (translated or "").split(BATCH_DELIMITER)
+
+class OfflineBackend:
+    # Deterministic local stand-in for tests and benchmarks; never touches the network
+    name = "offline"
+    max_chars = 4500
+
+    def __init__(self, latency=0.0, fail_rate=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.calls = 0
+
+    def translate_batch(self, texts, source, target):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise ConnectionError("simulated translation failure")
+        return [f"[{target}] {text}" for text in texts]
+
+BACKENDS = {"google": GoogleBackend, "offline": OfflineBackend}
+
+def get_backend(name=None, **kwargs):
+    name = name or os.environ.get("TRANSLATION_BACKEND", "google")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown translation backend: {name}")
+    return BACKENDS[name](**kwargs)
+
+# Batching
+
+def normalize_text(text):
+    # The delimiter must not appear inside a segment, so collapse all whitespace
+    return " ".join(text.split())
+
+def make_batches(texts, max_chars, max_items=100):
+    batches = []
+    current = []
+    size = 0
+    for idx, text in enumerate(texts):
+        extra = len(text) + len(BATCH_DELIMITER)
+        if current and (size + extra > max_chars or len(current) >= max_items):
+            batches.append(current)
+            current, size = [], 0
+        current.append(idx)
+        size += extra
+    if current:
+        batches.append(current)
+    return batches
+
+def call_with_retry(func, retries=3, backoff=0.5):
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception:
+            if attempt == retries:
+                raise
+            count("translation_retries_total")
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+def call_backend(backend, texts, source, target):
+    count("translation_calls_total", backend=backend.name)
+    try:
+        return backend.translate_batch(texts, source, target)
+    except Exception:
+        count("translation_errors_total", backend=backend.name)
+        raise
+
+def translate_batch(backend, texts, source, target, retries=3, backoff=0.5):
+    try:
+        translated = call_with_retry(lambda: call_backend(backend, texts, source, target), retries, backoff)
+    except Exception as e:
+        # Splitting the batch won't help when the backend itself is failing; give up fast
+        raise TranslationUnavailable(f"{backend.name} translation failed: {e}") from e
+    if len(translated) == len(texts):
+        return [t.strip() for t in translated]
+
+    # The delimiter did not survive; translate each segment on its own
+    count("translation_batch_fallbacks_total", backend=backend.name)
+    results = []
+    failures = 0
+    for text in texts:
+        try:
+            translated = call_with_retry(lambda: call_backend(backend, [text], source, target), retries, backoff)
+            results.append(BATCH_DELIMITER.join(translated).strip() if translated else FAILED_TRANSLATION)
+            failures = 0
+        except Exception as e:
+            failures += 1
+            if failures >= MAX_CONSECUTIVE_FAILURES:
+                raise TranslationUnavailable(f"{backend.name} translation failed {failures} times in a row: {e}") from e
+            results.append(FAILED_TRANSLATION)
+    failed = results.count(FAILED_TRANSLATION)
+    if failed:
+        count("translation_failed_segments_total", failed, backend=backend.name)
+    return results
+
+# Translation
+
+def translate_texts(texts, target, source="auto", backend=None, max_workers=4, retries=3, backoff=0.5, cache=None, progress_callback=None):
+    backend = backend or get_backend()
+    texts = [normalize_text(text) for text in texts]
+    results = [""] * len(texts)
+
+    # Repeated phrases are answered from the translation memory without a network call
+    cached = cache.get_many({text for text in texts if text}, source, target, backend.name) if cache else {}
+    for idx, text in enumerate(texts):
+        if text in cached:
+            results[idx] = cached[text]
+    pending = [idx for idx, text in enumerate(texts) if text and text not in cached]
+    count("translation_segments_total", sum(1 for text in texts if text in cached), source="cache")
+    count("translation_segments_total", len(pending), source="backend")
+    if not pending:
+        if progress_callback:
+            progress_callback(1.0)
+        return results
+    # Identical lines (chants, "Thank you.") are sent once and copied back to every segment that uses them
+    positions = {}
+    for idx in pending:
+        positions.setdefault(texts[idx], []).append(idx)
+    unique = list(positions)
+    batches = [[unique[i] for i in batch] for batch in make_batches(unique, backend.max_chars)]
+
+    done = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(translate_batch, backend, batch, source, target, retries, backoff): batch
+            for batch in batches
+        }
+        for future in concurrent.futures.as_completed(futures):
+            batch = futures[future]
+            try:
+                translated_batch = future.result()
+            except TranslationUnavailable:
+                # Don't start the batches still waiting for a worker
+                for pending_future in futures:
+                    pending_future.cancel()
+                raise
+            for text, translated in zip(batch, translated_batch):
+                for idx in positions[text]:
+                    results[idx] = translated
+            if cache:
+                cache.put_many([(text, translated) for text, translated in zip(batch, translated_batch)
+                                if translated != FAILED_TRANSLATION], source, target, backend.name)
+            done += len(batch)
+            if progress_callback:
+                progress_callback(done / len(unique))
+    return results
+
+def translate_segments(segments, target, source="auto", backend=None, max_workers=4, cache=None, progress_callback=None):
+    translated = translate_texts([seg["text"] for seg in segments], target, source, backend,
+                                 max_workers=max_workers, cache=cache, progress_callback=progress_callback)
+    return [{"start": seg["start"], "end": seg["end"], "text": text} for seg, text in zip(segments, translated)]
+
+def translate_segments_multi(segments, targets, source="auto", backend=None, max_workers=4, cache=None, progress_callback=None):
+    # {target: translated segments}; every language shares the backend and the translation memory
+    backend = backend or get_backend()
+    progress = dict.fromkeys(targets, 0.0)
+
+    def report(target, done):
+        progress[target] = done
+        if progress_callback:
+            progress_callback(sum(progress.values()) / len(progress))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(len(targets), TARGET_WORKERS))) as executor:
+        futures = {target: executor.submit(translate_segments, segments, target, source, backend, max_workers, cache,
+                                           lambda done, target=target: report(target, done))
+                   for target in targets}
+        return {target: future.result() for target, future in futures.items()}
+
+def translate_stream(segment_batches, target, source="auto", backend=None, max_workers=4, cache=None):
+    # Consumes (segments, extra) batches while they are still being produced and yields the
+    # translated batches in order; translation runs on the pool while the producer keeps going
+    backend = backend or get_backend()
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for segments, extra in segment_batches:
+            pending.append((executor.submit(translate_segments, segments, target, source, backend, 1, cache), extra))
+            while pending and pending[0][0].done():
+                future, done_extra = pending.popleft()
+                yield future.result(), done_extra
+        while pending:
+            future, done_extra = pending.popleft()
+            yield future.result(), done_extra
@@ -0,0 +1,139 @@
+import os                      # For cache file location
+import time                    # For last-used timestamps
+import sqlite3                 # Persistent on-disk cache tier
+import threading               # Cache is shared by the translation worker threads
+from collections import OrderedDict  # In-memory LRU tier
+
+
+CACHE_PATH = os.environ.get("TRANSLATION_CACHE_PATH", os.path.join("output", "translation_cache.sqlite"))
+MEMORY_ENTRIES = 10000
+DISK_ENTRIES = 500000
+
+def normalize_key_text(text):
+    return " ".join(text.split())
+
+class TranslationCache:
+    def __init__(self, path=CACHE_PATH, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES):
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(translations)")]
+        if columns and "backend" not in columns:
+            # Older caches didn't record which backend answered, so offline stand-ins can't be told apart; start over
+            self.db.execute("DROP TABLE translations")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                text TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                translated TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (text, source, target, backend)
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+        self.db.commit()
+        # Kept up to date on writes so eviction doesn't count a table of up to disk_entries rows under the lock.
+        # Only cache misses are written, so a replaced row (counted as new here) is rare; it is corrected on recount
+        self.rows = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def get_many(self, texts, source, target, backend):
+        found = {}
+        missing = []
+        with self.lock:
+            for text in texts:
+                key = (normalize_key_text(text), source, target, backend)
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[text] = self.memory[key]
+                    self.stats["memory_hits"] += 1
+                else:
+                    missing.append((text, key))
+
+            now = time.time()
+            for text, key in missing:
+                row = self.db.execute(
+                    "SELECT translated FROM translations WHERE text = ? AND source = ? AND target = ? AND backend = ?", key
+                ).fetchone()
+                if row is None:
+                    self.stats["misses"] += 1
+                    continue
+                found[text] = row[0]
+                self.stats["disk_hits"] += 1
+                self._remember(key, row[0])
+                self.db.execute(
+                    "UPDATE translations SET last_used = ? WHERE text = ? AND source = ? AND target = ? AND backend = ?", (now, *key)
+                )
+            if missing:
+                self.db.commit()
+        return found
+
+    def put_many(self, pairs, source, target, backend):
+        now = time.time()
+        rows = []
+        with self.lock:
+            for text, translated in pairs:
+                key = (normalize_key_text(text), source, target, backend)
+                self._remember(key, translated)
+                rows.append((*key, translated, now))
+            self.db.executemany(
+                "INSERT OR REPLACE INTO translations (text, source, target, backend, translated, last_used) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self.stats["writes"] += len(rows)
+            self.rows += len(rows)
+            self._evict_disk()
+            self.db.commit()
+
+    def invalidate(self, target=None, source=None):
+        with self.lock:
+            for key in [k for k in self.memory if (target is None or k[2] == target) and (source is None or k[1] == source)]:
+                del self.memory[key]
+            deleted = self.db.execute(
+                "DELETE FROM translations WHERE (? IS NULL OR target = ?) AND (? IS NULL OR source = ?)",
+                (target, target, source, source)
+            ).rowcount
+            self.rows = max(0, self.rows - deleted)
+            self.db.commit()
+
+    def hit_rate(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _remember(self, key, translated):
+        self.memory[key] = translated
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict_disk(self):
+        if self.rows <= self.disk_entries:
+            return
+        # The running count can only be high; make sure before deleting anything
+        self.rows = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        if self.rows > self.disk_entries:
+            # Drop the least recently used tenth so eviction doesn't run on every write
+            excess = self.rows - self.disk_entries + self.disk_entries // 10
+            self.db.execute(
+                "DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self.rows -= excess
+            self.stats["evictions"] += excess
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TranslationCache()
+        return _default_cache